@@ -1,11 +1,12 @@
 import asyncio
 import os
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from config import UPDATE_PERIOD_MIN
+from config import BATCH_SIZE, DB_CONCURRENCY, UPDATE_PERIOD_MIN
 from src.core.database import DatabaseService
+from src.core.event_loop import install_uvloop
 from src.notifications.notifications import AlertScheduler, NotificationService
 from src.notifications.telegram_bot import TelegramConfig
 from src.services.analytics import AnalyticsService
@@ -60,54 +61,82 @@ def normalize_price_value(price: str) -> Optional[float]:
         return None
 
 
-async def update_prices_job():
-    print("Обновление цен…")
-    rows = sheet_client.read_rows()
-    prices_by_row = await price_fetcher.fetch_prices_in_batches(rows)
+async def _persist_row(rows: List[Dict], row_idx: int, price) -> Optional[Tuple[int, object]]:
+    """Сохраняет цену строки в БД; возвращает (строка, значение для Google Sheets) или None."""
+    row_data = rows[row_idx - 2] if 0 <= (row_idx - 2) < len(rows) else {}
+    case_name = str(row_data.get("Name", "")).strip()
+    steam_url = row_data.get("Steam URL") or None
+
+    if not case_name:
+        print(f"Пропуск строки {row_idx}: не указано имя кейса")
+        return None
+
+    case = await db_service.save_case(case_name, steam_url=steam_url)
 
-    # Сохраняем данные в базу данных
-    for row_idx, price in prices_by_row.items():
-        row_data = rows[row_idx - 2] if 0 <= (row_idx - 2) < len(rows) else {}
-        case_name = str(row_data.get("Name", "")).strip()
-        steam_url = row_data.get("Steam URL") or None
+    numeric_price = normalize_price_value(price)
+    sheet_price_value = price
 
-        if not case_name:
-            print(f"Пропуск строки {row_idx}: не указано имя кейса")
-            continue
+    if numeric_price is None:
+        fallback_price = normalize_price_value(row_data.get("Price"))
+        if fallback_price is not None:
+            numeric_price = fallback_price
+            sheet_price_value = row_data.get("Price")
 
+    if numeric_price is not None:
         try:
-            case = await db_service.save_case(case_name, steam_url=steam_url)
+            await db_service.save_price(str(case.id), numeric_price)
+            await db_service.update_case_statistics(str(case.id))
+            print(f"row {row_idx}: {numeric_price} (saved to DB)")
         except Exception as exc:
-            print(f"Ошибка сохранения кейса {case_name}: {exc}")
-            continue
+            print(f"Error saving price to DB for row {row_idx}: {exc}")
+    else:
+        print(f"row {row_idx}: price '{price}' пропущена (нет данных)")
+
+    return row_idx, sheet_price_value if sheet_price_value is not None else ""
 
-        numeric_price = normalize_price_value(price)
-        sheet_price_value = price
 
-        if numeric_price is None:
-            fallback_price = normalize_price_value(row_data.get("Price"))
-            if fallback_price is not None:
-                numeric_price = fallback_price
-                sheet_price_value = row_data.get("Price")
+async def update_prices_job():
+    print("Обновление цен…")
+    rows = sheet_client.read_rows()
+
+    # Конвейер: цены Steam попадают в очередь по мере прихода,
+    # DB_CONCURRENCY обработчиков параллельно сохраняют их в БД
+    queue: asyncio.Queue = asyncio.Queue(maxsize=BATCH_SIZE * 2)
+    sheet_updates = {}
 
-        if numeric_price is not None:
+    async def consumer():
+        while True:
+            row_idx, price = await queue.get()
             try:
-                await db_service.save_price(str(case.id), numeric_price)
-                await db_service.update_case_statistics(str(case.id))
-                print(f"row {row_idx}: {numeric_price} (saved to DB)")
+                result = await _persist_row(rows, row_idx, price)
+                if result is not None:
+                    sheet_updates[result[0]] = result[1]
             except Exception as exc:
-                print(f"Error saving price to DB for row {row_idx}: {exc}")
-        else:
-            print(f"row {row_idx}: price '{price}' пропущена (нет данных)")
+                print(f"Ошибка сохранения кейса в строке {row_idx}: {exc}")
+            finally:
+                queue.task_done()
 
-        # Обновляем Google Sheets исходным значением
-        try:
-            value_for_sheet = sheet_price_value if sheet_price_value is not None else ""
-            sheet_client.update_price(row_idx, value_for_sheet)
-        except Exception as exc:
-            print(f"Ошибка обновления Google Sheets в строке {row_idx}: {exc}")
-        else:
-            print(f"row {row_idx}: {sheet_price_value}")
+    consumers = [asyncio.create_task(consumer()) for _ in range(DB_CONCURRENCY)]
+    try:
+        async for row_idx, price in price_fetcher.fetch_prices_in_batches(rows):
+            await queue.put((row_idx, price))
+        await queue.join()
+    finally:
+        for task in consumers:
+            task.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+
+    try:
+        written = sheet_client.batch_update_prices(sheet_updates)
+    except Exception as exc:
+        print(f"Ошибка обновления Google Sheets: {exc}")
+    else:
+        print(f"Google Sheets: обновлено {written} ячеек")
+
+    try:
+        await db_service.refresh_analytics_views()
+    except Exception as exc:
+        print(f"Ошибка обновления аналитических представлений: {exc}")
 
     print("Готово!")
 
@@ -116,6 +145,8 @@ async def initial_price_parsing():
     """Первоначальный парсинг цен при запуске"""
     print("🚀 Начальный парсинг цен...")
     try:
+        await price_fetcher.warm_up()
+        
         # Сначала синхронизируем кейсы из Google Sheets
         print("📋 Синхронизация кейсов из Google Sheets...")
         sync_result = await sheet_sync_service.full_sync()
@@ -142,6 +173,16 @@ async def cleanup_old_data_job():
         print(f"Ошибка при очистке данных: {e}")
 
 
+async def ensure_partitions_job():
+    """Задача для создания секций истории цен на текущий и следующий месяц"""
+    try:
+        partitions = await db_service.ensure_price_history_partitions()
+        if partitions:
+            print(f"Секции истории цен: {', '.join(partitions)}")
+    except Exception as e:
+        print(f"Ошибка при создании секций истории цен: {e}")
+
+
 async def update_all_statistics_job():
     """Задача для обновления статистики всех кейсов"""
     print("Обновление статистики...")
@@ -149,6 +190,7 @@ async def update_all_statistics_job():
         cases = await db_service.get_all_cases()
         for case in cases:
             await db_service.update_case_statistics(str(case.id))
+        await db_service.refresh_analytics_views()
         print(f"Статистика обновлена для {len(cases)} кейсов")
     except Exception as e:
         print(f"Ошибка при обновлении статистики: {e}")
@@ -177,6 +219,12 @@ async def sync_google_sheets_job():
         print(f"Ошибка при синхронизации с Google Sheets: {e}")
 
 
+async def close_http_sessions():
+    """Закрытие HTTP-сессий получения цен"""
+    await price_fetcher.close()
+    await sheet_sync_service.close()
+
+
 async def init_database():
     """Инициализация базы данных"""
     try:
@@ -187,6 +235,7 @@ async def init_database():
 
 
 def main() -> None:
+    install_uvloop()
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
 
@@ -208,6 +257,11 @@ def main() -> None:
         cleanup_old_data_job, trigger="interval", hours=6, id="cleanup_old_data"
     )
 
+    # Задача создания секций истории цен (раз в сутки)
+    scheduler.add_job(
+        ensure_partitions_job, trigger="interval", hours=24, id="ensure_partitions"
+    )
+
     # Задача обновления статистики (каждые 2 часа)
     scheduler.add_job(
         update_all_statistics_job, trigger="interval", hours=2, id="update_statistics"
@@ -239,6 +293,8 @@ def main() -> None:
         loop.run_forever()
     except (KeyboardInterrupt, SystemExit):
         print("Остановлено пользователем.")
+    finally:
+        loop.run_until_complete(close_http_sessions())
 
 
 if __name__ == "__main__":
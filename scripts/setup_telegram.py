@@ -10,7 +10,7 @@ from pathlib import Path
 # Добавляем корневую директорию в путь
 sys.path.append(str(Path(__file__).parent.parent))
 
-from src.notifications.telegram_bot import TelegramBot, TelegramConfig
+from src.notifications.telegram_bot import TelegramBot, TelegramConfig, close_shared_session
 
 
 async def test_telegram_connection(bot_token: str, chat_id: str):
@@ -134,5 +134,13 @@ async def main():
     print("3. Настройте пороговые значения алертов при необходимости")
 
 
+async def run():
+    """Запуск настройки с закрытием HTTP-сессии Telegram"""
+    try:
+        await main()
+    finally:
+        await close_shared_session()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime
 from typing import List, Optional
 
@@ -245,6 +246,12 @@ async def startup_event():
     await db_service.init_db()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Закрытие HTTP-сессии получения цен при остановке"""
+    await sheet_sync_service.close()
+
+
 @app.get("/")
 async def root():
     """Корневой эндпоинт"""
@@ -295,17 +302,17 @@ async def get_all_cases():
     if not cases:
         return []
 
-    case_ids = [str(case.id) for case in cases]
+    case_ids = [case.id for case in cases]
     latest_prices = await db_service.get_latest_prices_for_cases(case_ids)
     statistics = await db_service.get_all_statistics()
-    statistics_map = {str(stat.case_id): stat for stat in statistics}
+    statistics_map = {stat.case_id: stat for stat in statistics}
 
     case_data = []
     
     for case in cases:
         # Получаем последнюю цену для кейса
-        latest_price = latest_prices.get(str(case.id))
-        stats = statistics_map.get(str(case.id))
+        latest_price = latest_prices.get(case.id)
+        stats = statistics_map.get(case.id)
         
         case_data.append(SimpleCaseResponse(
             id=str(case.id),
@@ -349,17 +356,16 @@ async def get_case(case_id: str):
 @app.get("/cases/{case_id}/detail", response_model=CaseWithLatestPrice)
 async def get_case_detail(case_id: str):
     """Получение детальной информации о кейсе"""
-    async with db_service.async_session() as session:
-        stmt = select(Case).where(Case.id == case_id)
-        result = await session.execute(stmt)
-        case = result.scalar_one_or_none()
+    # Независимые запросы выполняются параллельно (каждый на своем соединении из пула)
+    case, latest_price, statistics = await asyncio.gather(
+        db_service.get_case(case_id),
+        db_service.get_latest_price_for_case(case_id),
+        db_service.get_case_statistics(case_id),
+    )
 
     if case is None:
         raise HTTPException(status_code=404, detail="Case not found")
 
-    latest_price = await db_service.get_latest_price_for_case(case_id)
-    statistics = await db_service.get_case_statistics(case_id)
-
     case_response = CaseResponse(
         id=str(case.id),
         name=case.name,
@@ -441,12 +447,15 @@ async def get_case_statistics(case_id: str):
 @app.get("/cases/with-prices", response_model=List[CaseWithLatestPrice])
 async def get_cases_with_latest_prices():
     """Получение всех кейсов с их последними ценами"""
-    cases_with_prices = await db_service.get_latest_prices()
+    cases_with_prices, all_statistics = await asyncio.gather(
+        db_service.get_latest_prices(),
+        db_service.get_all_statistics(),
+    )
+    statistics_by_case = {stat.case_id: stat for stat in all_statistics}
     
     result = []
     for case, price_history in cases_with_prices:
-        # Получаем статистику для кейса
-        statistics = await db_service.get_case_statistics(str(case.id))
+        statistics = statistics_by_case.get(case.id)
         
         case_response = CaseResponse(
             id=str(case.id),
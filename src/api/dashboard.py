@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime
 from pathlib import Path
 from typing import Dict
@@ -19,18 +20,14 @@ class DashboardService:
     
     async def get_dashboard_data(self) -> Dict:
         """Получение данных для дашборда"""
-        # Обзор рынка
-        market_overview = await self.analytics_service.get_market_overview()
-        
-        # Топ гейнеры и лузеры
-        top_gainers = await self.analytics_service.get_top_gainers(7, 5)
-        top_losers = await self.analytics_service.get_top_losers(7, 5)
-        
-        # Волатильные кейсы
-        volatile_cases = await self.analytics_service.get_most_volatile_cases(30, 5)
-        
-        # Последние цены
-        latest_prices = await self.db_service.get_latest_prices()
+        # Независимые запросы выполняются параллельно
+        market_overview, top_gainers, top_losers, volatile_cases, latest_prices = await asyncio.gather(
+            self.analytics_service.get_market_overview(),
+            self.analytics_service.get_top_gainers(7, 5),
+            self.analytics_service.get_top_losers(7, 5),
+            self.analytics_service.get_most_volatile_cases(30, 5),
+            self.db_service.get_latest_prices(),
+        )
         
         return {
             'market_overview': market_overview,
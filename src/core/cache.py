@@ -2,37 +2,72 @@
 Система кэширования для CaseParser
 """
 
-import json
+import inspect
 from datetime import datetime, timedelta
+from decimal import Decimal
+from fnmatch import fnmatchcase
 from functools import wraps
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
+import orjson
 from redis.asyncio import Redis
 
+from config import REDIS_URL
+
+
+def _orjson_default(value: Any) -> Any:
+    """Сериализация типов, которые orjson не поддерживает напрямую"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=_orjson_default)
+
 
 class CacheService:
     """Сервис кэширования с поддержкой Redis и in-memory кэша"""
     
-    def __init__(self, redis_url: str = "redis://localhost:6379/0", use_redis: bool = True):
+    def __init__(self, redis_url: str = REDIS_URL, use_redis: bool = True):
         self.use_redis = use_redis
         self.redis_client: Optional[Redis] = None
         self.memory_cache: Dict[str, Dict[str, Any]] = {}
+        # from_url не подключается к серверу — доступность проверяется ping при первом обращении
+        self._redis_checked = False
         
         if use_redis:
             try:
                 self.redis_client = Redis.from_url(redis_url, decode_responses=True)
-                print("✅ Redis кэш подключен")
             except Exception as e:
                 print(f"⚠️ Redis недоступен, используется in-memory кэш: {e}")
                 self.use_redis = False
     
+    async def _redis_available(self) -> bool:
+        """Использовать ли Redis; при недоступном сервере — переход на in-memory кэш"""
+        if not self.use_redis or self.redis_client is None:
+            return False
+        if self._redis_checked:
+            return True
+        
+        self._redis_checked = True
+        try:
+            await self.redis_client.ping()
+        except Exception as e:
+            print(f"⚠️ Redis недоступен, используется in-memory кэш: {e}")
+            self.use_redis = False
+            return False
+        
+        print("✅ Redis кэш подключен")
+        return True
+    
     async def get(self, key: str) -> Optional[Any]:
         """Получение значения из кэша"""
-        if self.use_redis and self.redis_client:
+        if await self._redis_available():
             try:
                 value = await self.redis_client.get(key)
                 if value:
-                    return json.loads(value)
+                    return orjson.loads(value)
             except Exception as e:
                 print(f"Ошибка получения из Redis: {e}")
                 return None
@@ -47,14 +82,29 @@ class CacheService:
         
         return None
     
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Получение нескольких значений одним запросом (MGET); порядок как у keys"""
+        if not keys:
+            return []
+        
+        if await self._redis_available():
+            try:
+                values = await self.redis_client.mget(keys)
+                return [orjson.loads(value) if value else None for value in values]
+            except Exception as e:
+                print(f"Ошибка получения из Redis: {e}")
+                return [None] * len(keys)
+        
+        return [await self.get(key) for key in keys]
+    
     async def set(self, key: str, value: Any, ttl_seconds: int = 300) -> bool:
         """Сохранение значения в кэш"""
-        if self.use_redis and self.redis_client:
+        if await self._redis_available():
             try:
                 await self.redis_client.setex(
                     key, 
                     ttl_seconds, 
-                    json.dumps(value, default=str)
+                    _dumps(value)
                 )
                 return True
             except Exception as e:
@@ -71,7 +121,7 @@ class CacheService:
     
     async def delete(self, key: str) -> bool:
         """Удаление значения из кэша"""
-        if self.use_redis and self.redis_client:
+        if await self._redis_available():
             try:
                 await self.redis_client.delete(key)
                 return True
@@ -86,9 +136,27 @@ class CacheService:
         
         return False
     
+    async def delete_pattern(self, pattern: str) -> int:
+        """Удаление всех ключей, подходящих под glob-шаблон"""
+        if await self._redis_available():
+            try:
+                keys = [key async for key in self.redis_client.scan_iter(match=pattern)]
+                if keys:
+                    await self.redis_client.delete(*keys)
+                return len(keys)
+            except Exception as e:
+                print(f"Ошибка удаления из Redis: {e}")
+                return 0
+        
+        # Fallback to memory cache
+        keys = [key for key in self.memory_cache if fnmatchcase(key, pattern)]
+        for key in keys:
+            del self.memory_cache[key]
+        return len(keys)
+    
     async def clear(self) -> bool:
         """Очистка всего кэша"""
-        if self.use_redis and self.redis_client:
+        if await self._redis_available():
             try:
                 await self.redis_client.flushdb()
                 return True
@@ -102,7 +170,7 @@ class CacheService:
     
     async def exists(self, key: str) -> bool:
         """Проверка существования ключа в кэше"""
-        if self.use_redis and self.redis_client:
+        if await self._redis_available():
             try:
                 return await self.redis_client.exists(key) > 0
             except Exception as e:
@@ -121,7 +189,7 @@ class CacheService:
     
     async def get_stats(self) -> Dict[str, Any]:
         """Получение статистики кэша"""
-        if self.use_redis and self.redis_client:
+        if await self._redis_available():
             try:
                 info = await self.redis_client.info()
                 return {
@@ -146,27 +214,40 @@ class CacheService:
         }
 
 
+def make_cache_key(key_prefix: str, name: str, **params: Any) -> str:
+    """Формирование ключа кэша вида prefix:name:arg=value,..."""
+    args = ",".join(f"{key}={value!r}" for key, value in params.items())
+    return f"{key_prefix}:{name}:{args}"
+
+
 def cached(ttl_seconds: int = 300, key_prefix: str = ""):
     """Декоратор для кэширования результатов функций"""
     def decorator(func):
+        signature = inspect.signature(func)
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Создаем ключ кэша на основе аргументов функции
-            cache_key = f"{key_prefix}:{func.__name__}:{hash(str(args) + str(kwargs))}"
+            # Ключ строится по именованным аргументам (с учетом значений по умолчанию), без self
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = {key: value for key, value in bound.arguments.items() if key != 'self'}
+            cache_key = make_cache_key(key_prefix, func.__name__, **params)
             
             # Пытаемся получить из кэша
-            cache_service = getattr(wrapper, '_cache_service', None)
-            if cache_service:
-                cached_result = await cache_service.get(cache_key)
-                if cached_result is not None:
-                    return cached_result
+            cache = getattr(wrapper, '_cache_service', None) or cache_service
+            cached_result = await cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
             
             # Выполняем функцию
             result = await func(*args, **kwargs)
             
             # Сохраняем в кэш
-            if cache_service:
-                await cache_service.set(cache_key, result, ttl_seconds)
+            if result is not None:
+                # Из Redis значение возвращается после JSON (datetime -> str); приводим к тому же
+                # виду и при промахе, чтобы тип результата не зависел от состояния кэша
+                result = orjson.loads(_dumps(result))
+                await cache.set(cache_key, result, ttl_seconds)
             
             return result
         
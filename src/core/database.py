@@ -1,16 +1,73 @@
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from uuid import UUID
+from typing import Dict, List, Optional, Tuple, Union
+from uuid import UUID, uuid4
 
-from sqlalchemy import and_, func, select
+import numpy as np
+from sqlalchemy import and_, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from config import DATABASE_URL
-from src.models import Base, Case, CaseStatistics, PriceHistory
+from src.core.cache import cache_service
+from src.models import ANALYTICS_VIEWS, Base, Case, CaseStatistics, PriceHistory
+from src.models.models import utc_now
+from src.models.views import ANALYTICS_VIEWS_DDL
+
+
+# Та же статистика, что в calculate_statistics, но сразу для множества кейсов
+_BULK_STATISTICS_SQL = """
+    INSERT INTO case_statistics (
+        id, case_id, current_price, min_price_30d, max_price_30d, avg_price_30d,
+        price_change_24h, price_change_7d, price_change_30d, last_updated
+    )
+    SELECT
+        gen_random_uuid(),
+        case_id,
+        current_price,
+        min_price,
+        max_price,
+        avg_price,
+        COALESCE((current_price - price_24h) / NULLIF(price_24h, 0) * 100, 0),
+        COALESCE((current_price - price_7d) / NULLIF(price_7d, 0) * 100, 0),
+        CASE WHEN points > 1
+            THEN COALESCE((current_price - price_30d) / NULLIF(price_30d, 0) * 100, 0)
+            ELSE 0
+        END,
+        timezone('utc', now())
+    FROM (
+        SELECT
+            case_id,
+            (array_agg(price ORDER BY timestamp DESC))[1] AS current_price,
+            (array_agg(price ORDER BY timestamp))[1] AS price_30d,
+            (array_agg(price ORDER BY timestamp) FILTER (WHERE timestamp >= :week_ago))[1] AS price_7d,
+            (array_agg(price ORDER BY timestamp) FILTER (WHERE timestamp >= :day_ago))[1] AS price_24h,
+            min(price) AS min_price,
+            max(price) AS max_price,
+            avg(price) AS avg_price,
+            count(*) AS points
+        FROM price_history
+        WHERE case_id = ANY(:case_ids) AND timestamp >= :month_ago
+        GROUP BY case_id
+    ) AS agg
+    ON CONFLICT (case_id) DO UPDATE SET
+        current_price = EXCLUDED.current_price,
+        min_price_30d = EXCLUDED.min_price_30d,
+        max_price_30d = EXCLUDED.max_price_30d,
+        avg_price_30d = EXCLUDED.avg_price_30d,
+        price_change_24h = EXCLUDED.price_change_24h,
+        price_change_7d = EXCLUDED.price_change_7d,
+        price_change_30d = EXCLUDED.price_change_30d,
+        last_updated = EXCLUDED.last_updated
+"""
 
 
 class DatabaseService:
     """Сервис для работы с базой данных"""
+
+    # Максимум строк в одном INSERT (ограничение asyncpg на число параметров)
+    _BULK_INSERT_CHUNK = 1000
+    # Размер порции при потоковом чтении истории цен
+    _STREAM_CHUNK = 1024
     
     def __init__(self):
         self.engine = create_async_engine(DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"))
@@ -20,6 +77,58 @@ class DatabaseService:
         """Инициализация базы данных и создание таблиц"""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+        await self.ensure_price_history_partitions()
+        await self.ensure_analytics_views()
+
+    async def ensure_analytics_views(self):
+        """Создание материализованных представлений для аналитики (если их нет).
+
+        Миграция 011 удаляет и пересоздает зависящие от price_history представления,
+        поэтому создавать их до применения миграций безопасно.
+        """
+        async with self.engine.begin() as conn:
+            for statement in ANALYTICS_VIEWS_DDL:
+                await conn.execute(text(statement))
+
+    async def refresh_analytics_views(self):
+        """Обновление материализованных представлений после загрузки цен"""
+        async with self.engine.begin() as conn:
+            for view_name in ANALYTICS_VIEWS:
+                # Представление могло не создаться (например, init_db еще не выполнялся)
+                exists = await conn.scalar(
+                    text("SELECT to_regclass(:name) IS NOT NULL"), {'name': view_name}
+                )
+                if not exists:
+                    continue
+                await conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}"))
+        # Кэшированные ответы аналитики устарели вместе с представлениями
+        await cache_service.delete_pattern("analytics:*")
+
+    async def ensure_price_history_partitions(self, months_ahead: int = 1) -> List[str]:
+        """Создание месячных секций price_history на текущий и следующие месяцы"""
+        async with self.engine.begin() as conn:
+            # До применения миграции 011 таблица может быть несекционированной
+            is_partitioned = await conn.scalar(text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass('price_history'))"
+            ))
+            if not is_partitioned:
+                return []
+
+            now = datetime.utcnow()
+            year, month = now.year, now.month
+            created = []
+            for _ in range(months_ahead + 1):
+                next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+                partition_name = f"price_history_{year:04d}_{month:02d}"
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name} PARTITION OF price_history "
+                    f"FOR VALUES FROM ('{year:04d}-{month:02d}-01') "
+                    f"TO ('{next_year:04d}-{next_month:02d}-01')"
+                ))
+                created.append(partition_name)
+                year, month = next_year, next_month
+            return created
     
     async def get_session(self) -> AsyncSession:
         """Получение сессии базы данных"""
@@ -55,13 +164,73 @@ class DatabaseService:
             price_history = PriceHistory(
                 case_id=case_id,
                 price=price,
-                currency=currency,
-                timestamp=datetime.utcnow()
+                currency=currency
             )
             session.add(price_history)
             await session.commit()
             await session.refresh(price_history)
             return price_history
+
+    async def bulk_insert_prices(self, rows: List[Dict]) -> int:
+        """Пакетное сохранение цен в историю.
+
+        Каждая строка - словарь с ключами ``case_id``, ``price`` и, опционально,
+        ``currency``/``timestamp``. Дубликаты по (case_id, timestamp) пропускаются.
+        """
+        if not rows:
+            return 0
+
+        inserted = 0
+        async with self.async_session() as session:
+            for start in range(0, len(rows), self._BULK_INSERT_CHUNK):
+                chunk = rows[start:start + self._BULK_INSERT_CHUNK]
+                stmt = (
+                    pg_insert(PriceHistory)
+                    .values(chunk)
+                    .on_conflict_do_nothing(index_elements=['case_id', 'timestamp'])
+                )
+                result = await session.execute(stmt)
+                inserted += result.rowcount
+            await session.commit()
+        return inserted
+    
+    async def bulk_save_cases(self, names: List[str]) -> Dict[str, UUID]:
+        """Пакетное сохранение кейсов по имени; возвращает {имя: id}"""
+        unique_names = list(dict.fromkeys(name for name in names if name))
+        if not unique_names:
+            return {}
+
+        case_ids: Dict[str, UUID] = {}
+        async with self.async_session() as session:
+            for start in range(0, len(unique_names), self._BULK_INSERT_CHUNK):
+                chunk = unique_names[start:start + self._BULK_INSERT_CHUNK]
+                stmt = pg_insert(Case).values([{'id': uuid4(), 'name': name} for name in chunk])
+                stmt = (
+                    stmt.on_conflict_do_update(
+                        index_elements=['name'],
+                        set_={'updated_at': utc_now()}
+                    )
+                    .returning(Case.id, Case.name)
+                )
+                result = await session.execute(stmt)
+                case_ids.update({row.name: row.id for row in result})
+            await session.commit()
+        return case_ids
+
+    async def bulk_update_case_statistics(self, case_ids: List[UUID]) -> None:
+        """Пересчет статистики набора кейсов одним INSERT ... ON CONFLICT на стороне БД"""
+        if not case_ids:
+            return
+
+        now = datetime.utcnow()
+        async with self.async_session() as session:
+            await session.execute(text(_BULK_STATISTICS_SQL), {
+                'case_ids': list(case_ids),
+                'month_ago': now - timedelta(days=30),
+                'week_ago': now - timedelta(days=7),
+                'day_ago': now - timedelta(days=1),
+            })
+            await session.commit()
     
     async def get_price_history(self, case_id: str, days: int = 30) -> List[PriceHistory]:
         """Получение истории цен за указанное количество дней"""
@@ -80,6 +249,36 @@ class DatabaseService:
             result = await session.execute(stmt)
             return result.scalars().all()
     
+    async def get_price_array(self, case_id: str, days: int = 30) -> np.ndarray:
+        """Цены кейса за период в хронологическом порядке (потоковое чтение в массив numpy)"""
+        start_date = datetime.utcnow() - timedelta(days=days)
+        stmt = (
+            select(PriceHistory.price)
+            .where(
+                and_(
+                    PriceHistory.case_id == case_id,
+                    PriceHistory.timestamp >= start_date
+                )
+            )
+            .order_by(PriceHistory.timestamp.asc())
+            .execution_options(yield_per=self._STREAM_CHUNK)
+        )
+
+        chunks = []
+        async with self.async_session() as session:
+            result = await session.stream(stmt)
+            async for partition in result.partitions():
+                chunks.append(np.fromiter((row[0] for row in partition), dtype=np.float64, count=len(partition)))
+
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float64)
+    
+    async def get_case(self, case_id: str) -> Optional[Case]:
+        """Получение кейса по идентификатору"""
+        async with self.async_session() as session:
+            stmt = select(Case).where(Case.id == case_id)
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+    
     async def get_all_cases(self) -> List[Case]:
         """Получение всех кейсов"""
         async with self.async_session() as session:
@@ -116,8 +315,8 @@ class DatabaseService:
             result = await session.execute(stmt)
             return result.all()
 
-    async def get_latest_prices_for_cases(self, case_ids: List[str]) -> Dict[str, PriceHistory]:
-        """Получение последних цен для набора кейсов"""
+    async def get_latest_prices_for_cases(self, case_ids: List[Union[str, UUID]]) -> Dict[UUID, PriceHistory]:
+        """Получение последних цен для набора кейсов (ключи — UUID кейсов)"""
         if not case_ids:
             return {}
 
@@ -161,7 +360,7 @@ class DatabaseService:
 
             result = await session.execute(stmt)
             prices = result.scalars().all()
-            return {str(price.case_id): price for price in prices}
+            return {price.case_id: price for price in prices}
     
     async def calculate_statistics(self, case_id: str) -> Dict:
         """Расчет статистики для кейса за последние 30 дней"""
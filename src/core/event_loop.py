@@ -0,0 +1,14 @@
+"""
+Настройка цикла событий asyncio
+"""
+
+import asyncio
+
+
+def install_uvloop() -> None:
+    """Подключает uvloop, если он установлен (на Windows его нет — остается стандартный цикл)."""
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
@@ -8,6 +8,17 @@ from typing import List, Optional
 from sqlalchemy import text
 
 from src.core.database import DatabaseService
+from src.models.views import ANALYTICS_VIEWS, ANALYTICS_VIEWS_DDL, VOLATILITY_VIEWS, VOLATILITY_VIEWS_DDL
+
+
+# Для миграции 011 (up и down): представления волатильности зависят от price_history,
+# поэтому на время замены таблицы они удаляются и затем создаются заново
+_DROP_VOLATILITY_VIEWS = '\n'.join(
+    f'DROP MATERIALIZED VIEW IF EXISTS {view.name};' for view in VOLATILITY_VIEWS.values()
+)
+_CREATE_VOLATILITY_VIEWS = '\n'.join(
+    f'EXECUTE $view${statement}$view$;' for statement in VOLATILITY_VIEWS_DDL
+)
 
 
 class MigrationService:
@@ -214,6 +225,280 @@ class MigrationService:
                 ALTER TABLE case_statistics DROP CONSTRAINT IF EXISTS fk_case_statistics_case;
             '''
         })
+
+        # Миграция 8: Серверные значения по умолчанию для временных меток
+        self.migrations.append({
+            'version': '008',
+            'name': 'server_side_timestamp_defaults',
+            'description': 'Перенос значений по умолчанию для временных меток на сторону БД',
+            'up': '''
+                ALTER TABLE cases ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+                ALTER TABLE cases ALTER COLUMN updated_at SET DEFAULT timezone('utc', now());
+                ALTER TABLE price_history ALTER COLUMN timestamp SET DEFAULT timezone('utc', now());
+                ALTER TABLE case_statistics ALTER COLUMN last_updated SET DEFAULT timezone('utc', now());
+                ALTER TABLE portfolio ALTER COLUMN purchase_date SET DEFAULT timezone('utc', now());
+                ALTER TABLE portfolio ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+                ALTER TABLE portfolio ALTER COLUMN updated_at SET DEFAULT timezone('utc', now());
+                ALTER TABLE portfolio_statistics ALTER COLUMN last_updated SET DEFAULT timezone('utc', now());
+                ALTER TABLE users ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+                ALTER TABLE users ALTER COLUMN updated_at SET DEFAULT timezone('utc', now());
+            ''',
+            'down': '''
+                ALTER TABLE cases ALTER COLUMN created_at DROP DEFAULT;
+                ALTER TABLE cases ALTER COLUMN updated_at DROP DEFAULT;
+                ALTER TABLE price_history ALTER COLUMN timestamp DROP DEFAULT;
+                ALTER TABLE case_statistics ALTER COLUMN last_updated DROP DEFAULT;
+                ALTER TABLE portfolio ALTER COLUMN purchase_date SET DEFAULT CURRENT_TIMESTAMP;
+                ALTER TABLE portfolio ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+                ALTER TABLE portfolio ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP;
+                ALTER TABLE portfolio_statistics ALTER COLUMN last_updated SET DEFAULT CURRENT_TIMESTAMP;
+                ALTER TABLE users ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP;
+                ALTER TABLE users ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP;
+            '''
+        })
+
+        # Миграция 9: Уникальность цены кейса на момент времени
+        self.migrations.append({
+            'version': '009',
+            'name': 'unique_price_case_timestamp',
+            'description': 'Уникальный ключ (case_id, timestamp) для пакетной вставки истории цен',
+            'up': '''
+                DELETE FROM price_history a
+                USING price_history b
+                WHERE a.case_id = b.case_id
+                  AND a.timestamp = b.timestamp
+                  AND a.id > b.id;
+
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM information_schema.table_constraints
+                        WHERE constraint_name = 'uq_price_case_timestamp'
+                    ) THEN
+                        ALTER TABLE price_history
+                        ADD CONSTRAINT uq_price_case_timestamp UNIQUE (case_id, timestamp);
+                    END IF;
+                END $$;
+            ''',
+            'down': 'ALTER TABLE price_history DROP CONSTRAINT IF EXISTS uq_price_case_timestamp;'
+        })
+
+        # Миграция 10: Удаление избыточных индексов
+        # Индекс по префиксу составного индекса (или дубль уникального ключа)
+        # только замедляет запись и занимает буферный кэш.
+        self.migrations.append({
+            'version': '010',
+            'name': 'drop_redundant_indexes',
+            'description': 'Удаление индексов, покрытых составными и уникальными индексами',
+            'up': '''
+                DROP INDEX IF EXISTS idx_price_case_id;
+                DROP INDEX IF EXISTS idx_price_case_timestamp;
+                DROP INDEX IF EXISTS idx_stats_case_id;
+            ''',
+            'down': '''
+                CREATE INDEX IF NOT EXISTS idx_price_case_id ON price_history (case_id);
+                CREATE INDEX IF NOT EXISTS idx_price_case_timestamp ON price_history (case_id, timestamp);
+                CREATE INDEX IF NOT EXISTS idx_stats_case_id ON case_statistics (case_id);
+            '''
+        })
+
+        # Миграция 11: Секционирование истории цен по месяцам
+        self.migrations.append({
+            'version': '011',
+            'name': 'partition_price_history',
+            'description': 'Перевод price_history на декларативное секционирование RANGE (timestamp) по месяцам',
+            'up': f'''
+                CREATE OR REPLACE FUNCTION create_price_history_partition(month_start DATE)
+                RETURNS void AS $$
+                DECLARE
+                    start_date DATE := date_trunc('month', month_start)::date;
+                    end_date DATE := (date_trunc('month', month_start) + interval '1 month')::date;
+                BEGIN
+                    EXECUTE format(
+                        'CREATE TABLE IF NOT EXISTS %I PARTITION OF price_history FOR VALUES FROM (%L) TO (%L)',
+                        'price_history_' || to_char(start_date, 'YYYY_MM'), start_date, end_date
+                    );
+                END;
+                $$ LANGUAGE plpgsql;
+
+                DO $migration$
+                DECLARE
+                    had_views BOOLEAN;
+                    legacy_partition RECORD;
+                BEGIN
+                    -- Новая база: create_all и ensure_price_history_partitions уже создали секционированную таблицу
+                    IF EXISTS (
+                        SELECT 1 FROM pg_partitioned_table
+                        WHERE partrelid = to_regclass('price_history')
+                    ) THEN
+                        RETURN;
+                    END IF;
+
+                    had_views := EXISTS (
+                        SELECT 1 FROM pg_matviews WHERE matviewname LIKE 'mv_volatility_%'
+                    );
+                    {_DROP_VOLATILITY_VIEWS}
+
+                    ALTER TABLE price_history RENAME TO price_history_legacy;
+                    ALTER TABLE price_history_legacy DROP CONSTRAINT IF EXISTS price_history_pkey;
+                    ALTER TABLE price_history_legacy DROP CONSTRAINT IF EXISTS uq_price_case_timestamp;
+                    DROP INDEX IF EXISTS idx_price_timestamp;
+                    DROP INDEX IF EXISTS idx_price_history_case_timestamp_desc;
+
+                    -- Дочерние таблицы старой таблицы не должны занимать имена новых секций
+                    FOR legacy_partition IN
+                        SELECT c.relname
+                        FROM pg_inherits i
+                        JOIN pg_class c ON c.oid = i.inhrelid
+                        WHERE i.inhparent = 'price_history_legacy'::regclass
+                    LOOP
+                        EXECUTE format(
+                            'ALTER TABLE %I RENAME TO %I',
+                            legacy_partition.relname, legacy_partition.relname || '_legacy'
+                        );
+                    END LOOP;
+
+                    CREATE TABLE price_history (
+                        id UUID NOT NULL DEFAULT gen_random_uuid(),
+                        case_id UUID NOT NULL,
+                        price DOUBLE PRECISION NOT NULL,
+                        currency VARCHAR(10) DEFAULT 'RUB',
+                        timestamp TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+                        CONSTRAINT price_history_pkey PRIMARY KEY (id, timestamp),
+                        CONSTRAINT uq_price_case_timestamp UNIQUE (case_id, timestamp),
+                        CONSTRAINT fk_price_history_case FOREIGN KEY (case_id)
+                            REFERENCES cases(id) ON DELETE CASCADE
+                    ) PARTITION BY RANGE (timestamp);
+
+                    CREATE INDEX IF NOT EXISTS idx_price_timestamp ON price_history (timestamp);
+                    CREATE INDEX IF NOT EXISTS idx_price_history_case_timestamp_desc
+                    ON price_history (case_id, timestamp DESC);
+
+                    PERFORM create_price_history_partition(month_start::date)
+                    FROM generate_series(
+                        date_trunc('month', COALESCE((SELECT min(timestamp) FROM price_history_legacy), now())),
+                        date_trunc('month', now() + interval '1 month'),
+                        interval '1 month'
+                    ) AS month_start;
+
+                    INSERT INTO price_history (id, case_id, price, currency, timestamp)
+                    SELECT id, case_id, price, currency, timestamp FROM price_history_legacy
+                    ON CONFLICT DO NOTHING;
+
+                    DROP TABLE price_history_legacy;
+
+                    IF had_views THEN
+                        {_CREATE_VOLATILITY_VIEWS}
+                    END IF;
+                END $migration$;
+            ''',
+            'down': f'''
+                DO $migration$
+                DECLARE
+                    had_views BOOLEAN;
+                BEGIN
+                    -- Представления волатильности зависят от price_history: удаляем их явно
+                    -- (без CASCADE) и пересоздаем поверх восстановленной таблицы
+                    had_views := EXISTS (
+                        SELECT 1 FROM pg_matviews WHERE matviewname LIKE 'mv_volatility_%'
+                    );
+                    {_DROP_VOLATILITY_VIEWS}
+
+                    CREATE TABLE price_history_plain (
+                        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                        case_id UUID NOT NULL REFERENCES cases(id) ON DELETE CASCADE,
+                        price DOUBLE PRECISION NOT NULL,
+                        currency VARCHAR(10) DEFAULT 'RUB',
+                        timestamp TIMESTAMP NOT NULL DEFAULT timezone('utc', now())
+                    );
+
+                    INSERT INTO price_history_plain (id, case_id, price, currency, timestamp)
+                    SELECT id, case_id, price, currency, timestamp FROM price_history;
+
+                    DROP TABLE price_history;
+                    DROP FUNCTION IF EXISTS create_price_history_partition(DATE);
+                    ALTER TABLE price_history_plain RENAME TO price_history;
+                    ALTER TABLE price_history RENAME CONSTRAINT price_history_plain_pkey TO price_history_pkey;
+                    ALTER TABLE price_history
+                    ADD CONSTRAINT uq_price_case_timestamp UNIQUE (case_id, timestamp);
+                    CREATE INDEX IF NOT EXISTS idx_price_timestamp ON price_history (timestamp);
+                    CREATE INDEX IF NOT EXISTS idx_price_history_case_timestamp_desc
+                    ON price_history (case_id, timestamp DESC);
+
+                    IF had_views THEN
+                        {_CREATE_VOLATILITY_VIEWS}
+                    END IF;
+                END $migration$;
+            '''
+        })
+
+        # Миграция 12: Материализованные представления для аналитики
+        self.migrations.append({
+            'version': '012',
+            'name': 'create_analytics_views',
+            'description': 'Материализованные представления обзора рынка и волатильности',
+            'up': ';\n'.join(ANALYTICS_VIEWS_DDL) + ';',
+            'down': '\n'.join(
+                f'DROP MATERIALIZED VIEW IF EXISTS {view_name};' for view_name in ANALYTICS_VIEWS
+            )
+        })
+
+
+        # Миграция 13: Одна строка статистики портфеля на пользователя
+        self.migrations.append({
+            'version': '013',
+            'name': 'unique_portfolio_statistics_user',
+            'description': 'Уникальный ключ user_id в portfolio_statistics для INSERT ... ON CONFLICT',
+            'up': '''
+                DELETE FROM portfolio_statistics a
+                USING portfolio_statistics b
+                WHERE a.user_id = b.user_id
+                  AND (a.last_updated, a.id::text) < (b.last_updated, b.id::text);
+
+                DROP INDEX IF EXISTS idx_portfolio_stats_user_id;
+
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM information_schema.table_constraints
+                        WHERE constraint_name = 'uq_portfolio_stats_user_id'
+                    ) THEN
+                        ALTER TABLE portfolio_statistics
+                        ADD CONSTRAINT uq_portfolio_stats_user_id UNIQUE (user_id);
+                    END IF;
+                END $$;
+            ''',
+            'down': '''
+                ALTER TABLE portfolio_statistics DROP CONSTRAINT IF EXISTS uq_portfolio_stats_user_id;
+                CREATE INDEX IF NOT EXISTS idx_portfolio_stats_user_id ON portfolio_statistics (user_id);
+            '''
+        })
+
+
+        # Миграция 14: Частичные покрывающие индексы для топа роста/падения
+        self.migrations.append({
+            'version': '014',
+            'name': 'add_price_change_indexes',
+            'description': 'Частичные покрывающие индексы по price_change_* в case_statistics',
+            'up': '''
+                CREATE INDEX IF NOT EXISTS idx_stats_price_change_24h
+                ON case_statistics (price_change_24h) INCLUDE (case_id, current_price, last_updated)
+                WHERE price_change_24h IS NOT NULL;
+
+                CREATE INDEX IF NOT EXISTS idx_stats_price_change_7d
+                ON case_statistics (price_change_7d) INCLUDE (case_id, current_price, last_updated)
+                WHERE price_change_7d IS NOT NULL;
+
+                CREATE INDEX IF NOT EXISTS idx_stats_price_change_30d
+                ON case_statistics (price_change_30d) INCLUDE (case_id, current_price, last_updated)
+                WHERE price_change_30d IS NOT NULL;
+            ''',
+            'down': '''
+                DROP INDEX IF EXISTS idx_stats_price_change_24h;
+                DROP INDEX IF EXISTS idx_stats_price_change_7d;
+                DROP INDEX IF EXISTS idx_stats_price_change_30d;
+            '''
+        })
     
     async def get_applied_migrations(self) -> List[str]:
         """Получение списка примененных миграций"""
@@ -3,6 +3,7 @@
 from .models import Base, Case, CaseStatistics, PriceHistory
 from .portfolio import Portfolio, PortfolioStatistics
 from .user import User
+from .views import ANALYTICS_VIEWS, MarketOverviewView, VOLATILITY_VIEWS
 
 __all__ = [
     'Base',
@@ -11,5 +12,8 @@ __all__ = [
     'PriceHistory', 
     'Portfolio',
     'PortfolioStatistics',
-    'User'
+    'User',
+    'ANALYTICS_VIEWS',
+    'MarketOverviewView',
+    'VOLATILITY_VIEWS'
 ]
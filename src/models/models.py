@@ -1,14 +1,19 @@
 import uuid
-from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, String, Text
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, String, Text, UniqueConstraint, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 
 Base = declarative_base()
 
 
+def utc_now():
+    """Текущее время в UTC на стороне БД (колонки хранятся без часового пояса)"""
+    return func.timezone("utc", func.now())
+
+
 class Case(Base):
     """Модель для хранения информации о кейсах"""
 
@@ -17,8 +22,8 @@ class Case(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False, unique=True)
     steam_url = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utc_now())
+    updated_at = Column(DateTime, server_default=utc_now(), onupdate=utc_now())
 
     # Связи
     portfolio_entries = relationship(
@@ -46,13 +51,17 @@ class PriceHistory(Base):
     )
     price = Column(Float, nullable=False)
     currency = Column(String(10), default="RUB")
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Ключ секционирования обязан входить в первичный ключ
+    timestamp = Column(DateTime, server_default=utc_now(), nullable=False, primary_key=True)
 
-    # Индексы для оптимизации запросов
+    # Индексы для оптимизации запросов.
+    # Правило: не индексируем префикс уже существующего составного индекса.
+    # Уникальный ключ (case_id, timestamp) обслуживает и фильтры по case_id.
+    # Таблица секционирована по месяцам (см. DatabaseService.ensure_price_history_partitions).
     __table_args__ = (
-        Index("idx_price_case_id", "case_id"),
+        UniqueConstraint("case_id", "timestamp", name="uq_price_case_timestamp"),
         Index("idx_price_timestamp", "timestamp"),
-        Index("idx_price_case_timestamp", "case_id", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
     )
 
 
@@ -75,10 +84,23 @@ class CaseStatistics(Base):
     price_change_24h = Column(Float)
     price_change_7d = Column(Float)
     price_change_30d = Column(Float)
-    last_updated = Column(DateTime, default=datetime.utcnow)
+    last_updated = Column(DateTime, server_default=utc_now())
 
-    # Индексы для оптимизации запросов
+    # Связи
+    case = relationship("Case", uselist=False)
+
+    # Индексы для оптимизации запросов (case_id индексируется ограничением unique).
+    # Частичные индексы по изменению цены отдают топ роста/падения без сортировки:
+    # рост читается прямым проходом, падение — обратным, поэтому ASC-дубли не нужны.
     __table_args__ = (
-        Index("idx_stats_case_id", "case_id"),
         Index("idx_stats_last_updated", "last_updated"),
+        *(
+            Index(
+                f"idx_stats_{column}",
+                column,
+                postgresql_where=text(f"{column} IS NOT NULL"),
+                postgresql_include=["case_id", "current_price", "last_updated"],
+            )
+            for column in ("price_change_24h", "price_change_7d", "price_change_30d")
+        ),
     )
@@ -1,11 +1,10 @@
 import uuid
-from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Index, Numeric, String
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Numeric, String, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
-from .models import Base
+from .models import Base, utc_now
 
 
 class Portfolio(Base):
@@ -17,10 +16,10 @@ class Portfolio(Base):
     user_id = Column(String(255), nullable=False, default='default')  # Для поддержки множественных пользователей
     quantity = Column(Numeric(10, 2), nullable=False)  # Количество кейсов
     purchase_price = Column(Numeric(10, 2), nullable=False)  # Цена покупки за штуку
-    purchase_date = Column(DateTime, default=datetime.utcnow, nullable=False)
+    purchase_date = Column(DateTime, server_default=utc_now(), nullable=False)
     notes = Column(String(500))  # Заметки
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utc_now())
+    updated_at = Column(DateTime, server_default=utc_now(), onupdate=utc_now())
     
     # Связи
     case = relationship("Case", back_populates="portfolio_entries")
@@ -44,10 +43,10 @@ class PortfolioStatistics(Base):
     total_profit = Column(Numeric(15, 2), nullable=False, default=0)  # Общая прибыль
     profit_percentage = Column(Numeric(5, 2), nullable=False, default=0)  # Процент прибыли
     total_cases = Column(Numeric(10, 2), nullable=False, default=0)  # Общее количество кейсов
-    last_updated = Column(DateTime, default=datetime.utcnow)
+    last_updated = Column(DateTime, server_default=utc_now())
     
     # Индексы
     __table_args__ = (
-        Index('idx_portfolio_stats_user_id', 'user_id'),
+        UniqueConstraint('user_id', name='uq_portfolio_stats_user_id'),
         Index('idx_portfolio_stats_last_updated', 'last_updated'),
     )
@@ -0,0 +1,89 @@
+"""
+Материализованные представления для аналитики
+"""
+
+from typing import List
+
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table
+from sqlalchemy.dialects.postgresql import UUID
+
+# Отдельные метаданные: Base.metadata.create_all не должен создавать представления как таблицы
+views_metadata = MetaData()
+
+# Периоды (в днях), для которых волатильность материализована
+VOLATILITY_VIEW_DAYS = (7, 30)
+
+
+MarketOverviewView = Table(
+    "mv_market_overview",
+    views_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("total_cases", Integer),
+    Column("cases_with_statistics", Integer),
+    Column("average_price", Float),
+    Column("gainers_24h", Integer),
+    Column("losers_24h", Integer),
+    Column("last_update", DateTime),
+)
+
+
+def _volatility_view(days: int) -> Table:
+    return Table(
+        f"mv_volatility_{days}d",
+        views_metadata,
+        Column("case_id", UUID(as_uuid=True), primary_key=True),
+        Column("name", String(255)),
+        Column("volatility", Float),
+        Column("avg_price", Float),
+        Column("min_price", Float),
+        Column("max_price", Float),
+    )
+
+
+VOLATILITY_VIEWS = {days: _volatility_view(days) for days in VOLATILITY_VIEW_DAYS}
+
+
+def _volatility_view_ddl(days: int) -> List[str]:
+    return [
+        f'''
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_volatility_{days}d AS
+        SELECT
+            c.id AS case_id,
+            c.name AS name,
+            stddev(p.price) AS volatility,
+            avg(p.price) AS avg_price,
+            min(p.price) AS min_price,
+            max(p.price) AS max_price
+        FROM price_history p
+        JOIN cases c ON c.id = p.case_id
+        WHERE p.timestamp >= timezone('utc', now()) - interval '{days} days'
+        GROUP BY c.id, c.name
+        HAVING count(p.id) > 5
+        ''',
+        f'CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_volatility_{days}d_case_id ON mv_volatility_{days}d (case_id)',
+        f'CREATE INDEX IF NOT EXISTS idx_mv_volatility_{days}d_volatility ON mv_volatility_{days}d (volatility DESC)',
+    ]
+
+
+# Представления волатильности читают price_history (их пересоздает миграция 011)
+VOLATILITY_VIEWS_DDL = [statement for days in VOLATILITY_VIEW_DAYS for statement in _volatility_view_ddl(days)]
+
+# DDL представлений; уникальные индексы нужны для REFRESH ... CONCURRENTLY
+ANALYTICS_VIEWS_DDL = [
+    '''
+    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_market_overview AS
+    SELECT
+        1 AS id,
+        count(c.id) AS total_cases,
+        count(s.id) AS cases_with_statistics,
+        avg(s.current_price) AS average_price,
+        count(s.id) FILTER (WHERE s.price_change_24h > 0) AS gainers_24h,
+        count(s.id) FILTER (WHERE s.price_change_24h < 0) AS losers_24h,
+        max(s.last_updated) AS last_update
+    FROM cases c
+    LEFT JOIN case_statistics s ON s.case_id = c.id
+    ''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_market_overview_id ON mv_market_overview (id)',
+] + VOLATILITY_VIEWS_DDL
+
+ANALYTICS_VIEWS = [MarketOverviewView.name] + [view.name for view in VOLATILITY_VIEWS.values()]
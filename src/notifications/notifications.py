@@ -2,16 +2,23 @@ import asyncio
 import logging
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, NamedTuple, Optional
 
-from sqlalchemy import and_, select
+from sqlalchemy import Row, and_, func, or_, select
 
 from src.core.database import DatabaseService
 from src.models.models import Case, CaseStatistics, PriceHistory
-from src.notifications.telegram_bot import TelegramConfig, TelegramNotificationService
+from src.notifications.telegram_bot import (
+    TelegramConfig,
+    TelegramNotificationService,
+    close_shared_session,
+)
 
+# Эмодзи направления изменения цены, индекс: изменение > 0
+_CHANGE_EMOJI = ("📉", "📈")
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class AlertThreshold:
     """Пороговые значения для алертов"""
     price_change_percent: float  # Процент изменения цены
@@ -19,9 +26,8 @@ class AlertThreshold:
     max_price: Optional[float] = None  # Максимальная цена для алерта
 
 
-@dataclass
-class Alert:
-    """Структура алерта"""
+class Alert(NamedTuple):
+    """Структура алерта (кортеж: дешевое создание в цикле проверки)"""
     case_id: str
     case_name: str
     current_price: float
@@ -53,65 +59,80 @@ class NotificationService:
         alerts = []
         
         async with self.db_service.async_session() as session:
-            # Получаем все кейсы со статистикой
+            # Получаем только кейсы, у которых изменение превысило хотя бы один порог,
+            # и только те колонки, которые нужны для алертов
             stmt = (
-                select(Case, CaseStatistics)
+                select(
+                    Case.id,
+                    Case.name,
+                    CaseStatistics.current_price,
+                    CaseStatistics.price_change_24h,
+                    CaseStatistics.price_change_7d
+                )
                 .join(CaseStatistics, Case.id == CaseStatistics.case_id)
-                .where(CaseStatistics.current_price.isnot(None))
+                .where(
+                    CaseStatistics.current_price.isnot(None),
+                    or_(
+                        func.abs(CaseStatistics.price_change_24h) >= self._period_threshold('24h'),
+                        func.abs(CaseStatistics.price_change_7d) >= self._period_threshold('7d')
+                    )
+                )
             )
             result = await session.execute(stmt)
-            cases_with_stats = result.all()
+            rows = result.all()
+        
+        for row in rows:
+            # Проверяем изменения за 24 часа
+            if row.price_change_24h is not None:
+                alert = await self._check_price_change_alert(row, row.price_change_24h, '24h')
+                if alert:
+                    alerts.append(alert)
             
-            for case, stats in cases_with_stats:
-                # Проверяем изменения за 24 часа
-                if stats.price_change_24h is not None:
-                    alert = await self._check_price_change_alert(
-                        case, stats, stats.price_change_24h, '24h'
-                    )
-                    if alert:
-                        alerts.append(alert)
-                
-                # Проверяем изменения за 7 дней
-                if stats.price_change_7d is not None:
-                    alert = await self._check_price_change_alert(
-                        case, stats, stats.price_change_7d, '7d'
-                    )
-                    if alert:
-                        alerts.append(alert)
+            # Проверяем изменения за 7 дней
+            if row.price_change_7d is not None:
+                alert = await self._check_price_change_alert(row, row.price_change_7d, '7d')
+                if alert:
+                    alerts.append(alert)
         
         return alerts
+
+    def _period_threshold(self, period: str) -> float:
+        """Пороговое значение изменения цены для периода"""
+        if period == '24h':
+            return self.alert_thresholds['medium_volatility'].price_change_percent
+        elif period == '7d':
+            return self.alert_thresholds['high_volatility'].price_change_percent
+        return self.alert_thresholds['low_volatility'].price_change_percent
     
     async def _check_price_change_alert(
         self, 
-        case: Case, 
-        stats: CaseStatistics, 
+        row: Row, 
         price_change: float, 
         period: str
     ) -> Optional[Alert]:
-        """Проверка конкретного изменения цены на предмет алерта"""
+        """Проверка конкретного изменения цены на предмет алерта
+
+        ``row`` - строка выборки с колонками id, name и current_price.
+        """
         
-        # Определяем пороговое значение в зависимости от периода
-        if period == '24h':
-            threshold = self.alert_thresholds['medium_volatility'].price_change_percent
-        elif period == '7d':
-            threshold = self.alert_thresholds['high_volatility'].price_change_percent
-        else:
-            threshold = self.alert_thresholds['low_volatility'].price_change_percent
+        threshold = self._period_threshold(period)
         
         # Проверяем, превышает ли изменение пороговое значение
+        # (SQL-фильтр отбирает кейсы, прошедшие хотя бы один из порогов)
         if abs(price_change) >= threshold:
             # Получаем предыдущую цену для расчета
-            previous_price = await self._get_previous_price(case.id, period)
+            previous_price = await self._get_previous_price(row.id, period)
             
             if previous_price:
+                # Позиционные аргументы в порядке полей Alert
                 return Alert(
-                    case_id=str(case.id),
-                    case_name=case.name,
-                    current_price=stats.current_price,
-                    previous_price=previous_price,
-                    price_change_percent=price_change,
-                    alert_type='price_increase' if price_change > 0 else 'price_decrease',
-                    timestamp=datetime.utcnow()
+                    str(row.id),
+                    row.name,
+                    row.current_price,
+                    previous_price,
+                    price_change,
+                    'price_increase' if price_change > 0 else 'price_decrease',
+                    datetime.utcnow()
                 )
         
         return None
@@ -174,7 +195,7 @@ class NotificationService:
     
     async def send_console_alert(self, alert: Alert):
         """Отправка алерта в консоль"""
-        emoji = "📈" if alert.price_change_percent > 0 else "📉"
+        emoji = _CHANGE_EMOJI[alert.price_change_percent > 0]
         self.logger.info(f"{emoji} АЛЕРТ: {alert.case_name} - {alert.price_change_percent:+.2f}% "
                         f"({alert.previous_price:.2f} → {alert.current_price:.2f} руб.)")
     
@@ -218,6 +239,7 @@ class NotificationService:
         """Отправка уведомления об остановке"""
         if self.telegram_service:
             await self.telegram_service.send_shutdown_notification()
+            await close_shared_session()
     
     async def test_telegram_connection(self) -> bool:
         """Тест подключения к Telegram"""
@@ -13,7 +13,7 @@ import aiohttp
 from src.core.database import DatabaseService
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TelegramConfig:
     """Конфигурация Telegram бота"""
     bot_token: str
@@ -22,59 +22,128 @@ class TelegramConfig:
     disable_web_page_preview: bool = True
 
 
+@dataclass(slots=True, frozen=True)
+class RetryPolicy:
+    """Политика повторной отправки сообщений"""
+    max_retries: int = 3  # Количество повторов после первой попытки
+    max_backoff: float = 10.0  # Максимальная пауза между повторами при 5xx (сек.)
+
+
+@dataclass(slots=True, frozen=True)
+class SendResult:
+    """Результат отправки сообщения"""
+    sent: bool
+    retried: int = 0  # Сколько повторов потребовалось
+    skipped: bool = False  # Отправлять было нечего
+
+    def __bool__(self) -> bool:
+        return self.sent
+
+
+# Общая HTTP-сессия: пул соединений с api.telegram.org переживает отдельные боты
+_SHARED_SESSION: Optional[aiohttp.ClientSession] = None
+
+
+async def get_shared_session() -> aiohttp.ClientSession:
+    """Получение общей HTTP-сессии (создается при первом обращении)"""
+    global _SHARED_SESSION
+    if _SHARED_SESSION is None or _SHARED_SESSION.closed:
+        _SHARED_SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300, keepalive_timeout=120),
+            timeout=aiohttp.ClientTimeout(total=10, connect=3)
+        )
+    return _SHARED_SESSION
+
+
+async def close_shared_session() -> None:
+    """Закрытие общей HTTP-сессии"""
+    global _SHARED_SESSION
+    if _SHARED_SESSION is not None and not _SHARED_SESSION.closed:
+        await _SHARED_SESSION.close()
+    _SHARED_SESSION = None
+
+
 class TelegramBot:
     """Telegram бот для отправки уведомлений"""
+
+    _SENTIMENT_EMOJI = {'bullish': '📈', 'bearish': '📉', 'neutral': '➡️'}
+    _CHANGE_EMOJI = ('📉', '📈')  # индекс: изменение > 0
     
-    def __init__(self, config: TelegramConfig):
+    def __init__(self, config: TelegramConfig, retry_policy: Optional[RetryPolicy] = None):
         self.config = config
+        self.retry_policy = retry_policy or RetryPolicy()
         self.base_url = f"https://api.telegram.org/bot{config.bot_token}"
         self.session: Optional[aiohttp.ClientSession] = None
         self.logger = logging.getLogger(__name__)
     
     async def __aenter__(self):
         """Асинхронный контекстный менеджер - вход"""
-        self.session = aiohttp.ClientSession()
+        self.session = await get_shared_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Асинхронный контекстный менеджер - выход"""
-        if self.session:
-            await self.session.close()
+        """Асинхронный контекстный менеджер - выход (общая сессия остается открытой)"""
+        self.session = None
     
-    async def send_message(self, text: str, chat_id: Optional[str] = None) -> bool:
-        """Отправка сообщения в Telegram"""
+    async def send_message(self, text: str, chat_id: Optional[str] = None) -> SendResult:
+        """Отправка сообщения в Telegram с повторами при 429 и 5xx"""
         if not self.session:
             self.logger.error("Сессия не инициализирована")
-            return False
+            return SendResult(sent=False)
         
         chat_id = chat_id or self.config.chat_id
+        url = f"{self.base_url}/sendMessage"
+        data = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": self.config.parse_mode,
+            "disable_web_page_preview": self.config.disable_web_page_preview
+        }
+        max_retries = self.retry_policy.max_retries
         
-        try:
-            url = f"{self.base_url}/sendMessage"
-            data = {
-                "chat_id": chat_id,
-                "text": text,
-                "parse_mode": self.config.parse_mode,
-                "disable_web_page_preview": self.config.disable_web_page_preview
-            }
-            
-            async with self.session.post(url, json=data) as response:
-                if response.status == 200:
-                    self.logger.info(f"Сообщение отправлено в чат {chat_id}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    self.logger.error(f"Ошибка отправки сообщения: {response.status} - {error_text}")
-                    return False
+        for attempt in range(max_retries + 1):
+            delay = None
+            try:
+                async with self.session.post(url, json=data) as response:
+                    if response.status == 200:
+                        self.logger.info(f"Сообщение отправлено в чат {chat_id}")
+                        return SendResult(sent=True, retried=attempt)
                     
-        except Exception as e:
-            self.logger.error(f"Исключение при отправке сообщения: {e}")
-            return False
+                    if response.status == 429:
+                        # Telegram сообщает, сколько секунд нужно подождать
+                        payload = await response.json(content_type=None)
+                        delay = payload.get('parameters', {}).get('retry_after', 1)
+                    elif response.status >= 500:
+                        delay = min(2 ** attempt, self.retry_policy.max_backoff)
+                    
+                    if delay is None or attempt == max_retries:
+                        error_text = await response.text()
+                        self.logger.error(f"Ошибка отправки сообщения: {response.status} - {error_text}")
+                        return SendResult(sent=False, retried=attempt)
+                    
+                    self.logger.warning(
+                        f"Telegram вернул {response.status}, повтор через {delay} сек. "
+                        f"({attempt + 1}/{max_retries})"
+                    )
+                        
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == max_retries:
+                    self.logger.error(f"Исключение при отправке сообщения: {e}")
+                    return SendResult(sent=False, retried=attempt)
+                delay = min(2 ** attempt, self.retry_policy.max_backoff)
+                self.logger.warning(f"Сетевая ошибка при отправке сообщения: {e}, повтор через {delay} сек.")
+            except Exception as e:
+                self.logger.error(f"Исключение при отправке сообщения: {e}")
+                return SendResult(sent=False, retried=attempt)
+            
+            await asyncio.sleep(delay)
+        
+        return SendResult(sent=False, retried=max_retries)
     
     async def send_alert(self, case_name: str, current_price: float, 
-                        previous_price: float, price_change_percent: float) -> bool:
+                        previous_price: float, price_change_percent: float) -> SendResult:
         """Отправка алерта о изменении цены"""
-        emoji = "📈" if price_change_percent > 0 else "📉"
+        emoji = self._CHANGE_EMOJI[price_change_percent > 0]
         
         message = f"""
 {emoji} <b>АЛЕРТ: {case_name}</b>
@@ -87,13 +156,9 @@ class TelegramBot:
         
         return await self.send_message(message)
     
-    async def send_market_summary(self, summary: Dict) -> bool:
+    async def send_market_summary(self, summary: Dict) -> SendResult:
         """Отправка сводки по рынку"""
-        sentiment_emoji = {
-            'bullish': '📈',
-            'bearish': '📉', 
-            'neutral': '➡️'
-        }.get(summary.get('market_sentiment', 'neutral'), '➡️')
+        sentiment_emoji = self._SENTIMENT_EMOJI.get(summary.get('market_sentiment', 'neutral'), '➡️')
         
         message = f"""
 {sentiment_emoji} <b>СВОДКА РЫНКА</b>
@@ -107,7 +172,7 @@ class TelegramBot:
         
         return await self.send_message(message)
     
-    async def send_top_movers(self, gainers: List[Dict], losers: List[Dict]) -> bool:
+    async def send_top_movers(self, gainers: List[Dict], losers: List[Dict]) -> SendResult:
         """Отправка топ гейнеров и лузеров"""
         message = "<b>🏆 ТОП ДВИЖЕНИЯ ЦЕН</b>\n\n"
         
@@ -124,10 +189,10 @@ class TelegramBot:
         
         return await self.send_message(message)
     
-    async def send_volatile_cases(self, volatile_cases: List[Dict]) -> bool:
+    async def send_volatile_cases(self, volatile_cases: List[Dict]) -> SendResult:
         """Отправка волатильных кейсов"""
         if not volatile_cases:
-            return True
+            return SendResult(sent=True, skipped=True)
         
         message = "<b>⚡ ВОЛАТИЛЬНЫЕ КЕЙСЫ</b>\n\n"
         
@@ -139,7 +204,7 @@ class TelegramBot:
         
         return await self.send_message(message)
     
-    async def send_error_notification(self, error_message: str) -> bool:
+    async def send_error_notification(self, error_message: str) -> SendResult:
         """Отправка уведомления об ошибке"""
         message = f"""
 🚨 <b>ОШИБКА СИСТЕМЫ</b>
@@ -150,7 +215,7 @@ class TelegramBot:
         
         return await self.send_message(message)
     
-    async def send_startup_notification(self) -> bool:
+    async def send_startup_notification(self) -> SendResult:
         """Отправка уведомления о запуске системы"""
         message = """
 🚀 <b>СИСТЕМА ЗАПУЩЕНА</b>
@@ -162,7 +227,7 @@ class TelegramBot:
         
         return await self.send_message(message)
     
-    async def send_shutdown_notification(self) -> bool:
+    async def send_shutdown_notification(self) -> SendResult:
         """Отправка уведомления об остановке системы"""
         message = """
 🛑 <b>СИСТЕМА ОСТАНОВЛЕНА</b>
@@ -206,23 +271,32 @@ class TelegramNotificationService:
         if not alerts:
             return
         
+        sent_count = 0
+        retried_count = 0
+        
         async with TelegramBot(self.telegram_config) as bot:
             for alert in alerts:
                 try:
-                    success = await bot.send_alert(
+                    result = await bot.send_alert(
                         case_name=alert['case_name'],
                         current_price=alert['current_price'],
                         previous_price=alert['previous_price'],
                         price_change_percent=alert['price_change_percent']
                     )
+                    retried_count += result.retried
                     
-                    if success:
+                    if result.sent:
+                        sent_count += 1
                         self.logger.info(f"Алерт отправлен: {alert['case_name']}")
                     else:
                         self.logger.error(f"Ошибка отправки алерта: {alert['case_name']}")
                         
                 except Exception as e:
                     self.logger.error(f"Исключение при отправке алерта: {e}")
+        
+        self.logger.info(
+            f"Доставлено алертов: {sent_count}/{len(alerts)}, повторов: {retried_count}"
+        )
     
     async def send_daily_summary(self) -> None:
         """Отправка ежедневной сводки"""
@@ -231,10 +305,12 @@ class TelegramNotificationService:
             analytics_service = AnalyticsService(self.db_service)
             
             # Получаем данные для сводки
-            market_overview = await analytics_service.get_market_overview()
-            top_gainers = await analytics_service.get_top_gainers(1, 5)  # За 24 часа
-            top_losers = await analytics_service.get_top_losers(1, 5)
-            volatile_cases = await analytics_service.get_most_volatile_cases(7, 5)
+            market_overview, top_gainers, top_losers, volatile_cases = await asyncio.gather(
+                analytics_service.get_market_overview(),
+                analytics_service.get_top_gainers(1, 5),  # За 24 часа
+                analytics_service.get_top_losers(1, 5),
+                analytics_service.get_most_volatile_cases(7, 5),
+            )
             
             async with TelegramBot(self.telegram_config) as bot:
                 # Отправляем сводку по рынку
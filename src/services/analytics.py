@@ -1,86 +1,103 @@
 from datetime import datetime, timedelta
 from typing import Dict, List
 
-from sqlalchemy import desc, func, select
+import numpy as np
+from sqlalchemy import bindparam, desc, func, select
 
+from config import ANALYTICS_CACHE_TTL
+from src.core.cache import cached
 from src.core.database import DatabaseService
-from src.models import Case, CaseStatistics, PriceHistory
+from src.models import VOLATILITY_VIEWS, Case, CaseStatistics, MarketOverviewView, PriceHistory
 
 
 class AnalyticsService:
     """Сервис для аналитики и статистики по кейсам"""
     
+    # Поле изменения цены для периода; остальные периоды используют 30-дневное
+    _FIELD_BY_DAYS = {1: 'price_change_24h', 7: 'price_change_7d', 30: 'price_change_30d'}
+    
     def __init__(self, db_service: DatabaseService):
         self.db_service = db_service
+        # Запросы топа строятся один раз на поле: при вызове подставляется только лимит
+        self._gainers_stmts = {
+            field: self._top_movers_stmt(field, descending=True) for field in self._FIELD_BY_DAYS.values()
+        }
+        self._losers_stmts = {
+            field: self._top_movers_stmt(field, descending=False) for field in self._FIELD_BY_DAYS.values()
+        }
+    
+    def _change_field(self, days: int) -> str:
+        """Имя поля статистики с изменением цены за период"""
+        return self._FIELD_BY_DAYS.get(days, 'price_change_30d')
+    
+    def _top_movers_stmt(self, field: str, descending: bool):
+        """Запрос топа изменения цены по полю статистики; лимит передается параметром"""
+        order_field = getattr(CaseStatistics, field)
+        return (
+            select(
+                Case.id,
+                Case.name,
+                CaseStatistics.current_price,
+                order_field.label('price_change'),
+                CaseStatistics.last_updated
+            )
+            .join(CaseStatistics, Case.id == CaseStatistics.case_id)
+            .where(order_field.isnot(None))
+            .order_by(desc(order_field) if descending else order_field.asc())
+            .limit(bindparam('lim'))
+        )
+    
+    async def _get_top_movers(self, stmt, limit: int) -> List[Dict]:
+        """Выполнение заранее построенного запроса топа изменения цены"""
+        async with self.db_service.async_session() as session:
+            result = await session.execute(stmt, {'lim': limit})
+            rows = result.all()
+        
+        return [
+            {
+                'case_id': str(row.id),
+                'name': row.name,
+                'current_price': row.current_price,
+                'price_change': row.price_change,
+                'last_updated': row.last_updated
+            }
+            for row in rows
+        ]
     
+    @cached(ttl_seconds=ANALYTICS_CACHE_TTL, key_prefix="analytics")
     async def get_top_gainers(self, days: int = 7, limit: int = 10) -> List[Dict]:
         """Получение кейсов с наибольшим ростом цены за указанный период"""
-        async with self.db_service.async_session() as session:
-            # Получаем статистику с сортировкой по росту цены
-            if days == 1:
-                order_field = CaseStatistics.price_change_24h
-            elif days == 7:
-                order_field = CaseStatistics.price_change_7d
-            else:
-                order_field = CaseStatistics.price_change_30d
-            
-            stmt = (
-                select(Case, CaseStatistics)
-                .join(CaseStatistics, Case.id == CaseStatistics.case_id)
-                .where(order_field.isnot(None))
-                .order_by(desc(order_field))
-                .limit(limit)
-            )
-            
-            result = await session.execute(stmt)
-            cases_with_stats = result.all()
-            
-            return [
-                {
-                    'case_id': str(case.id),
-                    'name': case.name,
-                    'current_price': stats.current_price,
-                    'price_change': getattr(stats, f'price_change_{days}d' if days > 1 else 'price_change_24h'),
-                    'last_updated': stats.last_updated
-                }
-                for case, stats in cases_with_stats
-            ]
+        return await self._get_top_movers(self._gainers_stmts[self._change_field(days)], limit)
     
+    @cached(ttl_seconds=ANALYTICS_CACHE_TTL, key_prefix="analytics")
     async def get_top_losers(self, days: int = 7, limit: int = 10) -> List[Dict]:
         """Получение кейсов с наибольшим падением цены за указанный период"""
-        async with self.db_service.async_session() as session:
-            # Получаем статистику с сортировкой по падению цены
-            if days == 1:
-                order_field = CaseStatistics.price_change_24h
-            elif days == 7:
-                order_field = CaseStatistics.price_change_7d
-            else:
-                order_field = CaseStatistics.price_change_30d
-            
-            stmt = (
-                select(Case, CaseStatistics)
-                .join(CaseStatistics, Case.id == CaseStatistics.case_id)
-                .where(order_field.isnot(None))
-                .order_by(order_field.asc())
-                .limit(limit)
-            )
-            
-            result = await session.execute(stmt)
-            cases_with_stats = result.all()
-            
+        return await self._get_top_movers(self._losers_stmts[self._change_field(days)], limit)
+    
+    @cached(ttl_seconds=ANALYTICS_CACHE_TTL, key_prefix="analytics")
+    async def get_most_volatile_cases(self, days: int = 30, limit: int = 10) -> List[Dict]:
+        """Получение наиболее волатильных кейсов (с наибольшим разбросом цен)"""
+        view = VOLATILITY_VIEWS.get(days)
+        if view is not None:
+            # Для стандартных периодов читаем заранее рассчитанное представление
+            async with self.db_service.async_session() as session:
+                stmt = select(view).order_by(desc(view.c.volatility)).limit(limit)
+                result = await session.execute(stmt)
+                rows = result.all()
+
             return [
                 {
-                    'case_id': str(case.id),
-                    'name': case.name,
-                    'current_price': stats.current_price,
-                    'price_change': getattr(stats, f'price_change_{days}d' if days > 1 else 'price_change_24h'),
-                    'last_updated': stats.last_updated
+                    'case_id': str(row.case_id),
+                    'name': row.name,
+                    'volatility': float(row.volatility),
+                    'avg_price': float(row.avg_price),
+                    'min_price': float(row.min_price),
+                    'max_price': float(row.max_price),
+                    'price_range': float(row.max_price - row.min_price)
                 }
-                for case, stats in cases_with_stats
+                for row in rows
             ]
-    
-    async def get_most_volatile_cases(self, days: int = 30, limit: int = 10) -> List[Dict]:
-        """Получение наиболее волатильных кейсов (с наибольшим разбросом цен)"""
+
         async with self.db_service.async_session() as session:
             start_date = datetime.utcnow() - timedelta(days=days)
             
@@ -100,66 +117,49 @@ class AnalyticsService:
             )
             
             stmt = (
-                select(Case, volatility_subquery)
+                select(
+                    Case.name,
+                    volatility_subquery.c.case_id,
+                    volatility_subquery.c.volatility,
+                    volatility_subquery.c.avg_price,
+                    volatility_subquery.c.min_price,
+                    volatility_subquery.c.max_price
+                )
                 .join(volatility_subquery, Case.id == volatility_subquery.c.case_id)
                 .order_by(desc(volatility_subquery.c.volatility))
                 .limit(limit)
             )
             
             result = await session.execute(stmt)
-            cases_with_volatility = result.all()
-            
-            return [
-                {
-                    'case_id': str(case.id),
-                    'name': case.name,
-                    'volatility': float(volatility.volatility),
-                    'avg_price': float(volatility.avg_price),
-                    'min_price': float(volatility.min_price),
-                    'max_price': float(volatility.max_price),
-                    'price_range': float(volatility.max_price - volatility.min_price)
-                }
-                for case, volatility in cases_with_volatility
-            ]
+            rows = result.all()
+            
+        return [
+            {
+                'case_id': str(row.case_id),
+                'name': row.name,
+                'volatility': float(row.volatility),
+                'avg_price': float(row.avg_price),
+                'min_price': float(row.min_price),
+                'max_price': float(row.max_price),
+                'price_range': float(row.max_price - row.min_price)
+            }
+            for row in rows
+        ]
     
+    @cached(ttl_seconds=ANALYTICS_CACHE_TTL, key_prefix="analytics")
     async def get_market_overview(self) -> Dict:
         """Получение общего обзора рынка"""
         async with self.db_service.async_session() as session:
-            # Общее количество кейсов
-            total_cases_stmt = select(func.count(Case.id))
-            total_cases_result = await session.execute(total_cases_stmt)
-            total_cases = total_cases_result.scalar()
-            
-            # Количество кейсов со статистикой
-            cases_with_stats_stmt = select(func.count(CaseStatistics.id))
-            cases_with_stats_result = await session.execute(cases_with_stats_stmt)
-            cases_with_stats = cases_with_stats_result.scalar()
-            
-            # Средняя цена всех кейсов
-            avg_price_stmt = select(func.avg(CaseStatistics.current_price))
-            avg_price_result = await session.execute(avg_price_stmt)
-            avg_price = avg_price_result.scalar()
-            
-            # Количество кейсов с ростом за 24 часа
-            gainers_24h_stmt = (
-                select(func.count(CaseStatistics.id))
-                .where(CaseStatistics.price_change_24h > 0)
-            )
-            gainers_24h_result = await session.execute(gainers_24h_stmt)
-            gainers_24h = gainers_24h_result.scalar()
-            
-            # Количество кейсов с падением за 24 часа
-            losers_24h_stmt = (
-                select(func.count(CaseStatistics.id))
-                .where(CaseStatistics.price_change_24h < 0)
-            )
-            losers_24h_result = await session.execute(losers_24h_stmt)
-            losers_24h = losers_24h_result.scalar()
-            
-            # Последнее обновление
-            last_update_stmt = select(func.max(CaseStatistics.last_updated))
-            last_update_result = await session.execute(last_update_stmt)
-            last_update = last_update_result.scalar()
+            # Показатели берутся из материализованного представления (обновляется после загрузки цен)
+            result = await session.execute(select(MarketOverviewView))
+            overview = result.one_or_none()
+
+            total_cases = overview.total_cases if overview else 0
+            cases_with_stats = overview.cases_with_statistics if overview else 0
+            avg_price = overview.average_price if overview else None
+            gainers_24h = overview.gainers_24h if overview else 0
+            losers_24h = overview.losers_24h if overview else 0
+            last_update = overview.last_update if overview else None
             
             return {
                 'total_cases': total_cases,
@@ -173,76 +173,71 @@ class AnalyticsService:
     
     async def get_price_trends(self, case_id: str, days: int = 30) -> Dict:
         """Анализ трендов цены для конкретного кейса"""
-        price_history = await self.db_service.get_price_history(case_id, days)
+        prices = await self.db_service.get_price_array(case_id, days)
         
-        if len(price_history) < 2:
+        if len(prices) < 2:
             return {'trend': 'insufficient_data', 'message': 'Недостаточно данных для анализа'}
         
-        prices = [p.price for p in price_history]
-        
-        # Простой анализ тренда
-        first_half = prices[:len(prices)//2]
-        second_half = prices[len(prices)//2:]
-        
-        first_avg = sum(first_half) / len(first_half)
-        second_avg = sum(second_half) / len(second_half)
+        # Простой анализ тренда (все вычисления — векторные проходы numpy)
+        middle = len(prices) // 2
+        first_avg = float(prices[:middle].mean())
+        second_avg = float(prices[middle:].mean())
         
         trend_direction = 'up' if second_avg > first_avg else 'down' if second_avg < first_avg else 'sideways'
         trend_strength = abs(second_avg - first_avg) / first_avg * 100
         
-        # Анализ волатильности
-        price_changes = [abs(prices[i] - prices[i-1]) for i in range(1, len(prices))]
-        volatility = sum(price_changes) / len(price_changes) if price_changes else 0
+        # Анализ волатильности: средний модуль изменения между соседними точками
+        volatility = float(np.abs(np.diff(prices)).mean())
         
         return {
             'trend': trend_direction,
             'trend_strength': trend_strength,
             'volatility': volatility,
             'price_range': {
-                'min': min(prices),
-                'max': max(prices),
-                'current': prices[-1]
+                'min': float(prices.min()),
+                'max': float(prices.max()),
+                'current': float(prices[-1])
             },
             'data_points': len(prices)
         }
     
     async def get_correlation_analysis(self, case_id_1: str, case_id_2: str, days: int = 30) -> Dict:
         """Анализ корреляции между двумя кейсами"""
-        history_1 = await self.db_service.get_price_history(case_id_1, days)
-        history_2 = await self.db_service.get_price_history(case_id_2, days)
-        
-        if len(history_1) < 2 or len(history_2) < 2:
-            return {'correlation': 0, 'message': 'Недостаточно данных для анализа корреляции'}
-        
-        # Создаем словари для сопоставления по времени
-        prices_1 = {p.timestamp.date(): p.price for p in history_1}
-        prices_2 = {p.timestamp.date(): p.price for p in history_2}
-        
-        # Находим общие даты
-        common_dates = set(prices_1.keys()) & set(prices_2.keys())
-        
-        if len(common_dates) < 2:
-            return {'correlation': 0, 'message': 'Недостаточно общих дат для анализа'}
-        
-        # Вычисляем корреляцию
-        prices_1_list = [prices_1[date] for date in sorted(common_dates)]
-        prices_2_list = [prices_2[date] for date in sorted(common_dates)]
+        start_date = datetime.utcnow() - timedelta(days=days)
+        
+        # Одна (средняя) цена на кейс за каждый день
+        day = func.date_trunc('day', PriceHistory.timestamp).label('day')
+        daily_prices = (
+            select(PriceHistory.case_id, day, func.avg(PriceHistory.price).label('price'))
+            .where(
+                PriceHistory.case_id.in_([case_id_1, case_id_2]),
+                PriceHistory.timestamp >= start_date
+            )
+            .group_by(PriceHistory.case_id, day)
+            .cte('daily_prices')
+        )
+        first = daily_prices.alias('daily_1')
+        second = daily_prices.alias('daily_2')
+        
+        # Корреляция Пирсона по общим датам считается агрегатом corr() на стороне БД
+        stmt = (
+            select(func.corr(first.c.price, second.c.price), func.count())
+            .select_from(first.join(second, first.c.day == second.c.day))
+            .where(first.c.case_id == case_id_1, second.c.case_id == case_id_2)
+        )
         
-        # Простая корреляция Пирсона
-        n = len(prices_1_list)
-        sum_1 = sum(prices_1_list)
-        sum_2 = sum(prices_2_list)
-        sum_1_sq = sum(x*x for x in prices_1_list)
-        sum_2_sq = sum(x*x for x in prices_2_list)
-        sum_12 = sum(x*y for x, y in zip(prices_1_list, prices_2_list))
+        async with self.db_service.async_session() as session:
+            result = await session.execute(stmt)
+            correlation, common_dates = result.one()
         
-        numerator = n * sum_12 - sum_1 * sum_2
-        denominator = ((n * sum_1_sq - sum_1**2) * (n * sum_2_sq - sum_2**2))**0.5
+        if common_dates < 2:
+            return {'correlation': 0, 'message': 'Недостаточно общих дат для анализа корреляции'}
         
-        correlation = numerator / denominator if denominator != 0 else 0
+        # При нулевой дисперсии corr() возвращает NULL
+        correlation = float(correlation) if correlation is not None else 0
         
         return {
             'correlation': correlation,
-            'common_dates': len(common_dates),
+            'common_dates': common_dates,
             'interpretation': 'strong_positive' if correlation > 0.7 else 'moderate_positive' if correlation > 0.3 else 'weak_positive' if correlation > 0 else 'weak_negative' if correlation > -0.3 else 'moderate_negative' if correlation > -0.7 else 'strong_negative'
         }
@@ -1,27 +1,35 @@
+import asyncio
+import hashlib
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from uuid import UUID
 
+import bcrypt
+from cachetools import TTLCache
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy import select
+from sqlalchemy import or_, select
 
 from config import ACCESS_TOKEN_EXPIRE_MINUTES, JWT_ALGORITHM, JWT_SECRET_KEY
 from src.core.database import DatabaseService
 from src.models.user import User
 
 
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
-    bcrypt__truncate_error=False,
-)
+# Результаты проверки bcrypt: успешные храним минуту, неуспешные — несколько секунд,
+# чтобы кэш не облегчал перебор паролей
+_verified_passwords: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+_rejected_passwords: TTLCache = TTLCache(maxsize=10_000, ttl=5)
+
+# Разобранные токены (sha256 токена -> (user_id, exp)) и пользователи по id;
+# TTL кэша пользователей — допустимое окно устаревания (см. get_user_from_token)
+_decoded_tokens: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+_users_by_id: TTLCache = TTLCache(maxsize=10_000, ttl=30)
 
 
 class AuthService:
     """Сервис аутентификации и управления пользователями"""
 
     _BCRYPT_MAX_BYTES = 72
+    _BCRYPT_ROUNDS = 12
 
     def __init__(self, db_service: DatabaseService):
         self.db_service = db_service
@@ -35,21 +43,37 @@ class AuthService:
         if len(encoded) <= self._BCRYPT_MAX_BYTES:
             return password
 
-        truncated = encoded[: self._BCRYPT_MAX_BYTES]
-        normalized = truncated.decode("utf-8", errors="ignore")
-
-        while len(normalized.encode("utf-8")) > self._BCRYPT_MAX_BYTES:
-            normalized = normalized[:-1]
+        # Отступаем назад с байтов продолжения (10xxxxxx), чтобы не разрезать символ
+        cut = self._BCRYPT_MAX_BYTES
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
 
-        return normalized
+        return encoded[:cut].decode("utf-8")
 
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         normalized = self._normalize_password(plain_password)
-        return pwd_context.verify(normalized, hashed_password)
-
-    def hash_password(self, password: str) -> str:
+        cache_key = (hashed_password, hashlib.sha256(normalized.encode("utf-8")).hexdigest())
+        if cache_key in _verified_passwords:
+            return True
+        if cache_key in _rejected_passwords:
+            return False
+
+        # bcrypt намеренно медленный — выполняем его вне цикла событий
+        is_valid = await asyncio.to_thread(
+            bcrypt.checkpw, normalized.encode("utf-8"), hashed_password.encode("utf-8")
+        )
+        if is_valid:
+            _verified_passwords[cache_key] = True
+        else:
+            _rejected_passwords[cache_key] = False
+        return is_valid
+
+    async def hash_password(self, password: str) -> str:
         normalized = self._normalize_password(password)
-        return pwd_context.hash(normalized)
+        hashed = await asyncio.to_thread(
+            bcrypt.hashpw, normalized.encode("utf-8"), bcrypt.gensalt(rounds=self._BCRYPT_ROUNDS)
+        )
+        return hashed.decode("utf-8")
 
     async def get_user_by_email(self, email: str) -> Optional[User]:
         async with self.db_service.async_session() as session:
@@ -78,15 +102,22 @@ class AuthService:
         normalized_email = email.strip().lower()
         normalized_username = username.strip()
 
-        existing_user = await self.get_user_by_email(normalized_email)
-        if existing_user:
-            raise ValueError("Пользователь с таким email уже существует")
+        # Проверяем email и имя пользователя одним запросом
+        async with self.db_service.async_session() as session:
+            stmt = (
+                select(User.email, User.username)
+                .where(or_(User.email == normalized_email, User.username == normalized_username))
+                .limit(2)
+            )
+            result = await session.execute(stmt)
+            existing = result.all()
 
-        existing_username = await self.get_user_by_username(normalized_username)
-        if existing_username:
+        if any(row.email == normalized_email for row in existing):
+            raise ValueError("Пользователь с таким email уже существует")
+        if existing:
             raise ValueError("Имя пользователя уже занято")
 
-        hashed_password = self.hash_password(password)
+        hashed_password = await self.hash_password(password)
 
         async with self.db_service.async_session() as session:
             user = User(
@@ -105,7 +136,7 @@ class AuthService:
         user = await self.get_user_by_email(email.strip().lower())
         if not user:
             return None
-        if not self.verify_password(password, user.hashed_password):
+        if not await self.verify_password(password, user.hashed_password):
             return None
         if not user.is_active:
             return None
@@ -117,13 +148,43 @@ class AuthService:
         to_encode = {"sub": str(user_id), "exp": expire}
         return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
-    async def get_user_from_token(self, token: str) -> Optional[User]:
+    def _decode_token(self, token: str) -> Optional[str]:
+        """Возвращает user_id из токена; подпись проверяется один раз на токен"""
+        token_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        cached = _decoded_tokens.get(token_key)
+        if cached is not None:
+            user_id, expires_at = cached
+            if expires_at > datetime.now(timezone.utc).timestamp():
+                return user_id
+            _decoded_tokens.pop(token_key, None)
+            return None
+
         try:
             payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-            user_id = payload.get("sub")
-            if user_id is None:
-                return None
         except JWTError:
             return None
 
-        return await self.get_user_by_id(user_id)
+        user_id = payload.get("sub")
+        expires_at = payload.get("exp")
+        if user_id is None:
+            return None
+        if expires_at is not None:
+            _decoded_tokens[token_key] = (user_id, float(expires_at))
+        return user_id
+
+    async def get_user_from_token(self, token: str) -> Optional[User]:
+        """Пользователь по токену.
+
+        Пользователь берется из кэша на 30 секунд: изменения в БД (например, деактивация)
+        начинают действовать для уже выданных токенов не позже чем через 30 секунд.
+        """
+        user_id = self._decode_token(token)
+        if user_id is None:
+            return None
+
+        user = _users_by_id.get(user_id)
+        if user is None:
+            user = await self.get_user_by_id(user_id)
+            if user is not None:
+                _users_by_id[user_id] = user
+        return user
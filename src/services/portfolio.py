@@ -2,20 +2,33 @@
 Сервис для управления портфелем кейсов
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Dict, List, Optional
 
-from sqlalchemy import and_, select
+from sqlalchemy import Numeric, Row, and_, case, cast, func, literal, select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from config import ANALYTICS_CACHE_TTL
+from src.core.cache import cache_service, cached, make_cache_key
 from src.core.database import DatabaseService
-from src.models.models import Case
+from src.models.models import Case, PriceHistory, utc_now
 from src.models.portfolio import Portfolio, PortfolioStatistics
 
 
 class PortfolioService:
     """Сервис для управления портфелем кейсов"""
     
+    # Колонки статистики, из которых собирается ответ
+    _STATISTICS_COLUMNS = (
+        PortfolioStatistics.total_investment,
+        PortfolioStatistics.current_value,
+        PortfolioStatistics.total_profit,
+        PortfolioStatistics.profit_percentage,
+        PortfolioStatistics.total_cases,
+        PortfolioStatistics.last_updated,
+    )
+    
     def __init__(self, db_service: DatabaseService):
         self.db_service = db_service
     
@@ -34,8 +47,7 @@ class PortfolioService:
                 user_id=user_id,
                 quantity=Decimal(str(quantity)),
                 purchase_price=Decimal(str(purchase_price)),
-                notes=notes,
-                purchase_date=datetime.utcnow()
+                notes=notes
             )
             
             session.add(portfolio_entry)
@@ -49,188 +61,157 @@ class PortfolioService:
     
     async def get_portfolio(self, user_id: str = 'default') -> List[Dict]:
         """Получение портфеля пользователя с текущими ценами"""
+        latest_price = self._latest_price_lateral()
         async with self.db_service.async_session() as session:
-            # Получаем все записи портфеля с информацией о кейсах
+            # Записи портфеля, кейсы и последние цены одним запросом
             stmt = (
-                select(Portfolio, Case)
+                select(
+                    Portfolio.id,
+                    Portfolio.case_id,
+                    Case.name.label('case_name'),
+                    Portfolio.quantity,
+                    Portfolio.purchase_price,
+                    Portfolio.purchase_date,
+                    Portfolio.notes,
+                    latest_price.c.price.label('current_price'),
+                    latest_price.c.timestamp.label('current_price_timestamp')
+                )
                 .join(Case, Portfolio.case_id == Case.id)
+                .outerjoin(latest_price, true())
                 .where(Portfolio.user_id == user_id)
                 .order_by(Portfolio.purchase_date.desc())
             )
             
             result = await session.execute(stmt)
             portfolio_entries = result.all()
-
-        if not portfolio_entries:
-            return []
-
-        case_ids = [str(case.id) for _, case in portfolio_entries]
-        latest_prices = await self.db_service.get_latest_prices_for_cases(case_ids)
             
         portfolio_data = []
-        for portfolio, case in portfolio_entries:
-            latest_price_entry = latest_prices.get(str(case.id))
-            current_price = float(latest_price_entry.price) if latest_price_entry else None
-            current_price_timestamp = latest_price_entry.timestamp if latest_price_entry else None
+        for entry in portfolio_entries:
+            current_price = float(entry.current_price) if entry.current_price is not None else None
             
-            quantity = Decimal(portfolio.quantity)
-            purchase_price = Decimal(portfolio.purchase_price)
-            total_investment = float(quantity * purchase_price)
-            current_value = float(quantity * Decimal(str(current_price))) if current_price is not None else 0.0
+            # Результат отдается во float, поэтому и считаем во float (Decimal — только для хранения)
+            quantity = float(entry.quantity)
+            purchase_price = float(entry.purchase_price)
+            total_investment = quantity * purchase_price
+            current_value = quantity * current_price if current_price is not None else 0.0
             profit = current_value - total_investment
             profit_percentage = (profit / total_investment * 100) if total_investment > 0 else 0.0
             
             portfolio_data.append({
-                'id': str(portfolio.id),
-                'case_id': str(portfolio.case_id),
-                'case_name': case.name,
-                'quantity': float(quantity),
-                'purchase_price': float(purchase_price),
-                'purchase_date': portfolio.purchase_date,
+                'id': str(entry.id),
+                'case_id': str(entry.case_id),
+                'case_name': entry.case_name,
+                'quantity': quantity,
+                'purchase_price': purchase_price,
+                'purchase_date': entry.purchase_date,
                 'current_price': current_price,
-                'current_price_timestamp': current_price_timestamp,
+                'current_price_timestamp': entry.current_price_timestamp,
                 'total_investment': total_investment,
                 'current_value': current_value,
                 'profit': profit,
                 'profit_percentage': profit_percentage,
-                'notes': portfolio.notes
+                'notes': entry.notes
             })
         
         return portfolio_data
     
+    def _latest_price_lateral(self):
+        """LATERAL-подзапрос последней цены для кейса записи портфеля"""
+        return (
+            select(PriceHistory.price, PriceHistory.timestamp)
+            .where(PriceHistory.case_id == Portfolio.case_id)
+            .order_by(PriceHistory.timestamp.desc())
+            .limit(1)
+            .lateral('latest_price')
+        )
+    
     async def get_current_price(self, case_id: str) -> Optional[float]:
         """Получение текущей цены кейса"""
         latest_prices = await self.db_service.get_latest_prices_for_cases([case_id])
-        latest_entry = latest_prices.get(str(case_id))
+        latest_entry = next(iter(latest_prices.values()), None)
         return float(latest_entry.price) if latest_entry else None
     
+    @cached(ttl_seconds=ANALYTICS_CACHE_TTL, key_prefix="portfolio")
     async def get_portfolio_statistics(self, user_id: str = 'default') -> Dict:
         """Получение статистики портфеля"""
         async with self.db_service.async_session() as session:
-            # Получаем или создаем статистику
-            stmt = select(PortfolioStatistics).where(PortfolioStatistics.user_id == user_id)
+            stmt = select(*self._STATISTICS_COLUMNS).where(PortfolioStatistics.user_id == user_id)
             result = await session.execute(stmt)
-            stats = result.scalar_one_or_none()
-            
-            if not stats:
-                await self.update_portfolio_statistics(user_id)
-                # Получаем обновленную статистику
-                result = await session.execute(stmt)
-                stats = result.scalar_one_or_none()
-            
-            if stats:
-                return {
-                    'total_investment': float(stats.total_investment),
-                    'current_value': float(stats.current_value),
-                    'total_profit': float(stats.total_profit),
-                    'profit_percentage': float(stats.profit_percentage),
-                    'total_cases': float(stats.total_cases),
-                    'last_updated': stats.last_updated
-                }
-            
-            return {
-                'total_investment': 0,
-                'current_value': 0,
-                'total_profit': 0,
-                'profit_percentage': 0,
-                'total_cases': 0,
-                'last_updated': datetime.utcnow()
-            }
+            stats = result.one_or_none()
+        
+        if stats is None:
+            # Статистики еще нет — рассчитываем и сразу возвращаем записанную строку
+            return await self.update_portfolio_statistics(user_id)
+        
+        return self._statistics_to_dict(stats)
     
-    async def update_portfolio_statistics(self, user_id: str = 'default'):
-        """Обновление статистики портфеля"""
-        async with self.db_service.async_session() as session:
-            # Получаем все записи портфеля
-            stmt = (
-                select(Portfolio, Case)
-                .join(Case, Portfolio.case_id == Case.id)
-                .where(Portfolio.user_id == user_id)
+    def _statistics_to_dict(self, stats: Row) -> Dict:
+        """Преобразование строки статистики портфеля в словарь ответа"""
+        return {
+            'total_investment': float(stats.total_investment),
+            'current_value': float(stats.current_value),
+            'total_profit': float(stats.total_profit),
+            'profit_percentage': float(stats.profit_percentage),
+            'total_cases': float(stats.total_cases),
+            'last_updated': stats.last_updated
+        }
+    
+    async def update_portfolio_statistics(self, user_id: str = 'default') -> Dict:
+        """Обновление статистики портфеля (возвращает записанные значения)"""
+        latest_price = self._latest_price_lateral()
+        
+        # Суммы по портфелю (для пустого портфеля агрегат дает нули)
+        totals = (
+            select(
+                func.coalesce(func.sum(Portfolio.quantity * Portfolio.purchase_price), 0).label('total_investment'),
+                func.coalesce(func.sum(Portfolio.quantity * cast(latest_price.c.price, Numeric)), 0).label('current_value'),
+                func.coalesce(func.sum(Portfolio.quantity), 0).label('total_cases')
             )
-            
-            result = await session.execute(stmt)
-            portfolio_entries = result.all()
-
-        if not portfolio_entries:
-            # Если записей нет, то удаляем существующую статистику (если была)
-            await self._reset_portfolio_statistics(user_id)
-            return
-
-        case_ids = [str(case.id) for _, case in portfolio_entries]
-        latest_prices = await self.db_service.get_latest_prices_for_cases(case_ids)
-            
-        total_investment = Decimal('0')
-        current_value = Decimal('0')
-        total_cases = Decimal('0')
-            
-        for portfolio, case in portfolio_entries:
-            # Рассчитываем инвестиции
-            investment = portfolio.quantity * portfolio.purchase_price
-            total_investment += investment
-            total_cases += portfolio.quantity
-            
-            # Получаем текущую цену
-            latest_price_entry = latest_prices.get(str(case.id))
-            if latest_price_entry is not None:
-                current_value += portfolio.quantity * Decimal(str(latest_price_entry.price))
-            
-        # Рассчитываем прибыль
-        total_profit = current_value - total_investment
-        profit_percentage = (total_profit / total_investment * 100) if total_investment > 0 else Decimal('0')
-            
-        # Обновляем или создаем статистику
+            .select_from(Portfolio)
+            .outerjoin(latest_price, true())
+            .where(Portfolio.user_id == user_id)
+            .subquery('totals')
+        )
+        total_profit = totals.c.current_value - totals.c.total_investment
+        
+        # Расчет и запись статистики одним INSERT ... ON CONFLICT
+        source = select(
+            func.gen_random_uuid(),
+            literal(user_id),
+            totals.c.total_investment,
+            totals.c.current_value,
+            total_profit,
+            case(
+                (totals.c.total_investment > 0, total_profit / totals.c.total_investment * 100),
+                else_=0
+            ),
+            totals.c.total_cases,
+            utc_now()
+        )
+        stmt = pg_insert(PortfolioStatistics).from_select(
+            ['id', 'user_id', 'total_investment', 'current_value', 'total_profit',
+             'profit_percentage', 'total_cases', 'last_updated'],
+            source
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PortfolioStatistics.user_id],
+            set_={
+                'total_investment': stmt.excluded.total_investment,
+                'current_value': stmt.excluded.current_value,
+                'total_profit': stmt.excluded.total_profit,
+                'profit_percentage': stmt.excluded.profit_percentage,
+                'total_cases': stmt.excluded.total_cases,
+                'last_updated': stmt.excluded.last_updated
+            }
+        ).returning(*self._STATISTICS_COLUMNS)
+        
         async with self.db_service.async_session() as session:
-            stmt = select(PortfolioStatistics).where(PortfolioStatistics.user_id == user_id)
             result = await session.execute(stmt)
-            stats = result.scalar_one_or_none()
-
-            if stats:
-                stats.total_investment = total_investment
-                stats.current_value = current_value
-                stats.total_profit = total_profit
-                stats.profit_percentage = profit_percentage
-                stats.total_cases = total_cases
-                stats.last_updated = datetime.utcnow()
-            else:
-                stats = PortfolioStatistics(
-                    user_id=user_id,
-                    total_investment=total_investment,
-                    current_value=current_value,
-                    total_profit=total_profit,
-                    profit_percentage=profit_percentage,
-                    total_cases=total_cases,
-                    last_updated=datetime.utcnow()
-                )
-                session.add(stats)
-
+            stats = result.one()
             await session.commit()
 
-    async def _reset_portfolio_statistics(self, user_id: str):
-        """Сброс статистики портфеля до нулевых значений"""
-        async with self.db_service.async_session() as session:
-            stmt = select(PortfolioStatistics).where(PortfolioStatistics.user_id == user_id)
-            result = await session.execute(stmt)
-            stats = result.scalar_one_or_none()
-
-            if stats:
-                stats.total_investment = Decimal('0')
-                stats.current_value = Decimal('0')
-                stats.total_profit = Decimal('0')
-                stats.profit_percentage = Decimal('0')
-                stats.total_cases = Decimal('0')
-                stats.last_updated = datetime.utcnow()
-            else:
-                stats = PortfolioStatistics(
-                    user_id=user_id,
-                    total_investment=Decimal('0'),
-                    current_value=Decimal('0'),
-                    total_profit=Decimal('0'),
-                    profit_percentage=Decimal('0'),
-                    total_cases=Decimal('0'),
-                    last_updated=datetime.utcnow()
-                )
-                session.add(stats)
-
-            await session.commit()
+        await self._invalidate_statistics_cache(user_id)
+        return self._statistics_to_dict(stats)
     
     async def remove_from_portfolio(self, portfolio_id: str, user_id: str = 'default') -> bool:
         """Удаление записи из портфеля"""
@@ -294,22 +275,54 @@ class PortfolioService:
     
     async def get_portfolio_performance(self, user_id: str = 'default', days: int = 30) -> Dict:
         """Получение производительности портфеля за период"""
+        stats = await self.get_portfolio_statistics(user_id)
+        
+        start_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+        
+        # Стоимость позиций по первой цене периода и по последней цене — одним запросом
+        first_price = (
+            select(PriceHistory.price)
+            .where(
+                PriceHistory.case_id == Portfolio.case_id,
+                PriceHistory.timestamp >= start_date
+            )
+            .order_by(PriceHistory.timestamp.asc())
+            .limit(1)
+            .lateral('first_price')
+        )
+        latest_price = self._latest_price_lateral()
+        stmt = (
+            select(
+                func.coalesce(func.sum(Portfolio.quantity * cast(first_price.c.price, Numeric)), 0),
+                func.coalesce(func.sum(Portfolio.quantity * cast(latest_price.c.price, Numeric)), 0)
+            )
+            .select_from(Portfolio)
+            .join(first_price, true())
+            .join(latest_price, true())
+            .where(Portfolio.user_id == user_id)
+        )
+        
         async with self.db_service.async_session() as session:
-            # Получаем статистику портфеля
-            stats = await self.get_portfolio_statistics(user_id)
-            
-            # Рассчитываем изменение за период
-            start_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-            start_date = start_date.replace(day=start_date.day - days)
-            
-            # Здесь можно добавить логику для расчета исторической производительности
-            # Пока возвращаем текущую статистику
-            
-            return {
-                'current_stats': stats,
-                'period_days': days,
-                'performance_rating': self.calculate_performance_rating(stats['profit_percentage'])
-            }
+            result = await session.execute(stmt)
+            start_value, end_value = result.one()
+        
+        start_value = float(start_value)
+        end_value = float(end_value)
+        period_change = end_value - start_value
+        
+        return {
+            'current_stats': stats,
+            'period_days': days,
+            'period_start_value': start_value,
+            'period_end_value': end_value,
+            'period_change': period_change,
+            'period_change_percentage': (period_change / start_value * 100) if start_value > 0 else 0.0,
+            'performance_rating': self.calculate_performance_rating(stats['profit_percentage'])
+        }
+    
+    async def _invalidate_statistics_cache(self, user_id: str):
+        """Сброс кэшированной статистики портфеля пользователя"""
+        await cache_service.delete(make_cache_key("portfolio", "get_portfolio_statistics", user_id=user_id))
     
     def calculate_performance_rating(self, profit_percentage: float) -> str:
         """Расчет рейтинга производительности портфеля"""
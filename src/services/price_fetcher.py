@@ -1,98 +1,187 @@
 import asyncio
 import random
-from typing import Dict, List
+import re
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from urllib.parse import quote
 
-import aiohttp
+import httpx
+import orjson
+from aiolimiter import AsyncLimiter
 
 from config import (
-    CONCURRENCY, STEAM_CURRENCY, STEAM_COUNTRY,
-    RETRY_COUNT, RETRY_DELAY,
+    CONCURRENCY, STEAM_CURRENCY, STEAM_COUNTRY, STEAM_RPS,
+    RETRY_COUNT, RETRY_DELAY, MAX_RETRY_WALL,
     BATCH_SIZE, BATCH_SLEEP
 )
 
+STEAM_HOST = "steamcommunity.com"
 STEAM_API = (
-    "https://steamcommunity.com/market/priceoverview/"
+    f"https://{STEAM_HOST}/market/priceoverview/"
     "?country={country}&currency={currency}&appid=730&market_hash_name={name}"
 )
+# Все, кроме имени, постоянно — собираем префикс URL один раз
+STEAM_API_PREFIX = STEAM_API.format(country=STEAM_COUNTRY, currency=STEAM_CURRENCY, name="")
 
 
-class PriceFetcher:
-    """Асинхронно получает цены для списка кейсов с повторами."""
+@lru_cache(maxsize=4096)
+def _quote_name(name: str) -> str:
+    # Набор кейсов от синхронизации к синхронизации почти не меняется
+    return quote(name, safe="")
+
+# Быстрый путь: достаем lowest_price из сырого ответа без разбора JSON
+# (значения с escape-последовательностями разбираются через orjson)
+_LOWEST_PRICE_RE = re.compile(rb'"lowest_price"\s*:\s*"([^"\\]*)"')
 
-    def __init__(self) -> None:
-        self.sem = asyncio.Semaphore(CONCURRENCY)
 
-    async def _one_request(self, session: aiohttp.ClientSession, url: str) -> str:
-        async with self.sem, session.get(url, timeout=30) as resp:
-            if resp.status != 200:
-                return "N/A"
-            data = await resp.json()
+def _extract_lowest_price(body: bytes) -> str:
+    match = _LOWEST_PRICE_RE.search(body)
+    if match is not None:
+        return match.group(1).decode("utf-8")
 
-            price_raw = data.get("lowest_price", "N/A")
-            price = price_raw.replace(" руб.", "").replace("\u200e", "")
+    data = orjson.loads(body)
+    return data.get("lowest_price", "N/A")
 
-            return price
 
-    async def _fetch(self, session: aiohttp.ClientSession, name: str) -> str:
-        url_name = quote(name)
-        url = STEAM_API.format(
-            country=STEAM_COUNTRY, currency=STEAM_CURRENCY, name=url_name
-        )
+# Сетевая ошибка или таймаут повторяются так же, как ответ 5xx
+_TRANSPORT_ERROR_STATUS = 503
+
+
+def _retry_after_seconds(resp: httpx.Response, default: float) -> float:
+    try:
+        return max(float(resp.headers.get("Retry-After", default)), 0.0)
+    except ValueError:
+        return default
+
+
+class PriceFetcher:
+    """Асинхронно получает цены для списка кейсов с повторами."""
 
+    def __init__(self) -> None:
+        self.sem = asyncio.Semaphore(CONCURRENCY)
+        # Семафор ограничивает параллельность, лимитер — частоту запросов (RPS) к Steam
+        self.limiter = AsyncLimiter(max_rate=STEAM_RPS, time_period=1.0)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def _ensure_client(self) -> httpx.AsyncClient:
+        """Один клиент на все синхронизации: HTTP/2 мультиплексирует запросы в одном соединении."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=CONCURRENCY,
+                    max_keepalive_connections=CONCURRENCY,
+                    keepalive_expiry=75,
+                ),
+            )
+        return self._client
+
+    async def warm_up(self) -> None:
+        """Заранее резолвит Steam и открывает keep-alive соединение, чтобы первая пачка не ждала DNS/TLS."""
+        client = await self._ensure_client()
+        try:
+            await client.head(f"https://{STEAM_HOST}/", timeout=10.0)
+        except httpx.HTTPError as exc:
+            print(f"Не удалось прогреть соединение со Steam: {exc}")
+
+    async def close(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def _one_request(self, client: httpx.AsyncClient, url: str) -> Tuple[int, str, float]:
+        """Возвращает (HTTP-статус, цена, Retry-After в секундах)."""
+        async with self.limiter, self.sem:
+            try:
+                resp = await client.get(url, timeout=30.0)
+            except httpx.TransportError as exc:
+                print(f"Сетевая ошибка при запросе к Steam: {exc!r}")
+                return _TRANSPORT_ERROR_STATUS, "N/A", 0.0
+        if resp.status_code == 429:
+            return resp.status_code, "N/A", _retry_after_seconds(resp, RETRY_DELAY)
+        if resp.status_code != 200:
+            return resp.status_code, "N/A", 0.0
+        price_raw = _extract_lowest_price(resp.content)
+        price = price_raw.replace(" руб.", "").replace("\u200e", "")
+
+        return resp.status_code, price, 0.0
+
+    async def _fetch(self, client: httpx.AsyncClient, name: str) -> str:
+        url = STEAM_API_PREFIX + _quote_name(name)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MAX_RETRY_WALL
         delay = RETRY_DELAY
         for attempt in range(1, RETRY_COUNT + 1):
-            price = await self._one_request(session, url)
-            if price != "N/A":
+            status, price, retry_after = await self._one_request(client, url)
+
+            if status == 200 and price != "N/A":
                 return price
 
-            await asyncio.sleep(delay + random.uniform(0, 0.4))
-            delay *= 2
+            if status == 429:
+                # Ждем столько, сколько просит сервер, без удвоения задержки
+                pause = retry_after
+            elif status >= 500 or status == 200:
+                # Ошибка сервера, сбой сети или пустой ответ — экспоненциальная задержка
+                pause = delay + random.uniform(0, 0.4)
+                delay *= 2
+            else:
+                # 4xx: повтор не поможет
+                break
+
+            # Повторы не должны занимать больше MAX_RETRY_WALL секунд
+            if attempt == RETRY_COUNT or loop.time() + pause > deadline:
+                break
+            await asyncio.sleep(pause)
 
         return "N/A"
 
     async def fetch_prices(self, rows: List[Dict]) -> Dict[int, str]:
-        prices = {}
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=CONCURRENCY)) as session:
-            tasks, indices = [], []
-            for idx, row in enumerate(rows, start=2):
-                name = row["Name"]
-                tasks.append(asyncio.create_task(self._fetch(session, name)))
-                indices.append(idx)
+        client = await self._ensure_client()
+
+        if not hasattr(asyncio, "TaskGroup"):
+            # Python < 3.11
+            prices = await asyncio.gather(*(self._fetch(client, row["Name"]) for row in rows))
+            return dict(enumerate(prices, start=2))
 
-            for idx, coro in zip(indices, tasks):
-                prices[idx] = await coro
+        # При ошибке TaskGroup сразу отменяет остальные запросы
+        async with asyncio.TaskGroup() as tg:
+            tasks = {
+                idx: tg.create_task(self._fetch(client, row["Name"]))
+                for idx, row in enumerate(rows, start=2)
+            }
+        return {idx: task.result() for idx, task in tasks.items()}
 
-        return prices
+    async def _fetch_row(self, client: httpx.AsyncClient, row_idx: int, name: str) -> Tuple[int, str]:
+        return row_idx, await self._fetch(client, name)
 
-    async def fetch_prices_in_batches(self, rows: List[Dict]) -> Dict[int, str]:
+    async def fetch_prices_in_batches(self, rows: List[Dict]) -> AsyncIterator[Tuple[int, str]]:
         """
-        Возвращает словарь {row_index_in_sheet : price},
+        Асинхронно отдает пары (row_index_in_sheet, price) по мере получения ответов,
         причём row_index_in_sheet — глобальный (A1‑нотация: 2, 3, 4…).
+        Медленный запрос не задерживает обработку уже полученных цен пачки.
         """
-        result: Dict[int, str] = {}
         total = len(rows)
 
-        async with aiohttp.ClientSession(
-                connector=aiohttp.TCPConnector(limit_per_host=CONCURRENCY)
-        ) as session:
-            for start in range(0, total, BATCH_SIZE):
-                end = min(start + BATCH_SIZE, total)
-                batch_rows = rows[start:end]
-                row_indices = range(start + 2, end + 2)
-
-                print(f"Запрос пачки {start + 2}–{end + 1}")
-
-                tasks = [
-                    asyncio.create_task(self._fetch(session, r["Name"]))
-                    for r in batch_rows
-                ]
-                prices = await asyncio.gather(*tasks)
-
-                for idx, price in zip(row_indices, prices):
-                    result[idx] = price
-
-                if end < total:
-                    await asyncio.sleep(BATCH_SLEEP)
-
-        return result
+        client = await self._ensure_client()
+        for start in range(0, total, BATCH_SIZE):
+            end = min(start + BATCH_SIZE, total)
+            batch_rows = rows[start:end]
+            row_indices = range(start + 2, end + 2)
+
+            print(f"Запрос пачки {start + 2}–{end + 1}")
+
+            tasks = [
+                asyncio.create_task(self._fetch_row(client, row_idx, r["Name"]))
+                for r, row_idx in zip(batch_rows, row_indices)
+            ]
+            try:
+                for fut in asyncio.as_completed(tasks):
+                    yield await fut
+            finally:
+                # Потребитель прервал итерацию — не оставляем висящих запросов
+                for task in tasks:
+                    task.cancel()
+
+            if end < total:
+                await asyncio.sleep(BATCH_SLEEP)
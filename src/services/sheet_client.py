@@ -1,11 +1,19 @@
+import time
+from typing import Any, Dict, List, Optional
+
 import gspread
+from gspread.utils import ValueInputOption, ValueRenderOption
 from oauth2client.service_account import ServiceAccountCredentials
-from typing import List, Dict
 
 from config import GOOGLE_SHEET_NAME, GOOGLE_CREDS_FILE
 
 
 class GoogleSheetClient:
+    # Текстовые колонки: неформатированное чтение отдает числа, а потребители ждут строки
+    TEXT_COLUMNS = ("Name", "Steam URL")
+    # Сколько секунд переиспользовать прочитанные строки (full_sync читает лист дважды подряд)
+    ROWS_CACHE_TTL = 60
+
     def __init__(self) -> None:
         scope = [
             "https://spreadsheets.google.com/feeds",
@@ -16,9 +24,35 @@ class GoogleSheetClient:
         )
         self.gc = gspread.authorize(creds)
         self.sheet = self.gc.open(GOOGLE_SHEET_NAME).sheet1
+        self._rows_cache: Optional[List[Dict]] = None
+        self._rows_cached_at = 0.0
 
     def read_rows(self) -> List[Dict]:
-        return self.sheet.get_all_records()
+        """Строки листа как словари по заголовкам — один запрос значений вместо get_all_records."""
+        now = time.monotonic()
+        if self._rows_cache is not None and now - self._rows_cached_at < self.ROWS_CACHE_TTL:
+            return self._rows_cache
+
+        values = self.sheet.get(value_render_option=ValueRenderOption.unformatted)
+        if not values:
+            rows: List[Dict] = []
+        else:
+            headers, data = values[0], values[1:]
+            width = len(headers)
+            # API обрезает пустые ячейки в конце строки — дополняем, как get_all_records
+            rows = [dict(zip(headers, row + [""] * (width - len(row)))) for row in data]
+            for row in rows:
+                for column in self.TEXT_COLUMNS:
+                    value = row.get(column)
+                    if value is not None and not isinstance(value, str):
+                        row[column] = str(value)
+
+        self._rows_cache = rows
+        self._rows_cached_at = now
+        return rows
+
+    def _invalidate_rows(self) -> None:
+        self._rows_cache = None
 
     def update_price(self, row_idx: int, price: str) -> None:
         """Обновляем E‑колонку (5) ТОЛЬКО если цена валидная."""
@@ -27,3 +61,24 @@ class GoogleSheetClient:
             if current_val:
                 return
         self.sheet.update_cell(row_idx, 5, price)
+        self._invalidate_rows()
+
+    def batch_update_prices(self, updates: Dict[int, Any]) -> int:
+        """Записывает цены в E‑колонку одним запросом; N/A не затирает существующее значение."""
+        if not updates:
+            return 0
+
+        current_values = self.sheet.col_values(5)
+        data = []
+        for row_idx, price in updates.items():
+            if price == "N/A":
+                current_val = current_values[row_idx - 1] if row_idx <= len(current_values) else ""
+                if current_val:
+                    continue
+            data.append({"range": f"E{row_idx}", "values": [[price]]})
+
+        if data:
+            # Как update_cell: значения разбираются таблицей ("149,90" станет числом, а не текстом)
+            self.sheet.batch_update(data, value_input_option=ValueInputOption.user_entered)
+            self._invalidate_rows()
+        return len(data)
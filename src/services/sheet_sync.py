@@ -2,55 +2,94 @@
 Сервис для синхронизации данных с Google Sheets
 """
 
-from typing import Dict, Optional
+import asyncio
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
 
+from src.core.cache import cache_service
+from src.core.database import DatabaseService
+from src.services.price_fetcher import PriceFetcher
+from src.services.sheet_client import GoogleSheetClient
 
-def _normalize_price(value: Optional[str]) -> Optional[float]:
-    """Преобразует строковое представление цены Steam в float."""
-    if value is None:
-        return None
+# Таблица для str.translate: за один проход по строке (на уровне C) удаляет пробелы,
+# знаки валюты и буквы "руб", а запятую заменяет точкой. Точка от "руб." остается в конце
+# и снимается rstrip
+_PRICE_TRANSLATION = str.maketrans({",": ".", **dict.fromkeys(" \u00a0\u200e₽руб")})
+# Частый случай — уже чистое число ("123.45" / "123,45"): чистка не нужна
+_PLAIN_PRICE = re.compile(r"[0-9]+(?:[.,][0-9]+)?")
 
-    if isinstance(value, (int, float)):
-        return float(value)
 
-    price_str = str(value).strip()
+@lru_cache(maxsize=8192)
+def _normalize_price_str(price_str: str) -> Optional[float]:
+    """Разбор строки цены Steam; одни и те же строки повторяются между синхронизациями."""
+    price_str = price_str.strip()
     if not price_str or price_str.upper() == "N/A":
         return None
 
-    cleaned = (
-        price_str.replace("руб.", "")
-        .replace("₽", "")
-        .replace("\u200e", "")
-        .replace("\u00a0", "")
-        .replace(" ", "")
-        .replace(",", ".")
-    )
+    if _PLAIN_PRICE.fullmatch(price_str):
+        cleaned = price_str.replace(",", ".")
+    else:
+        cleaned = price_str.translate(_PRICE_TRANSLATION).rstrip(".")
 
     try:
         return float(cleaned)
     except ValueError:
         return None
 
-from src.core.database import DatabaseService
-from src.services.price_fetcher import PriceFetcher
-from src.services.sheet_client import GoogleSheetClient
+
+def _normalize_price(value: Optional[str]) -> Optional[float]:
+    """Преобразует строковое представление цены Steam в float."""
+    if value is None:
+        return None
+
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    return _normalize_price_str(str(value))
 
 
 class SheetSyncService:
     """Сервис для синхронизации данных с Google Sheets"""
     
+    # Сколько хранить последнюю цену кейса в кэше (переживает перезапуск)
+    _LAST_PRICE_TTL = 7 * 24 * 3600
+    
     def __init__(self, db_service: DatabaseService):
         self.db_service = db_service
         self.sheet_client = GoogleSheetClient()
         self.price_fetcher = PriceFetcher()
+        # Последняя сохраненная цена по имени кейса: неизменившиеся кейсы не пишем.
+        # Ключ — имя, а не номер строки: строки листа можно вставлять, удалять и сортировать
+        self._last_prices: Dict[str, str] = {}
+    
+    async def _load_last_prices(self, case_names: List[str]):
+        """Подгрузка последних цен из кэша для кейсов, которых нет в памяти"""
+        missing = [name for name in dict.fromkeys(case_names) if name and name not in self._last_prices]
+        if not missing:
+            return
+        
+        values = await cache_service.get_many([f"sheet:last_price:{name}" for name in missing])
+        for name, value in zip(missing, values):
+            if value is not None:
+                self._last_prices[name] = value
     
-    async def sync_cases_from_sheet(self) -> Dict:
+    async def _remember_last_prices(self, prices: Dict[str, str]):
+        """Запоминание цен успешно сохраненных кейсов (в памяти и в кэше)"""
+        self._last_prices.update(prices)
+        await asyncio.gather(*(
+            cache_service.set(f"sheet:last_price:{name}", price, self._LAST_PRICE_TTL)
+            for name, price in prices.items()
+        ))
+    
+    async def sync_cases_from_sheet(self, rows: Optional[List[Dict]] = None) -> Dict:
         """Синхронизация кейсов из Google Sheets в базу данных"""
         try:
             print("🔄 Синхронизация кейсов из Google Sheets...")
             
-            # Получаем данные из Google Sheets
-            rows = self.sheet_client.read_rows()
+            # Получаем данные из Google Sheets (если строки не переданы)
+            if rows is None:
+                rows = self.sheet_client.read_rows()
             
             if not rows:
                 return {
@@ -96,13 +135,14 @@ class SheetSyncService:
                 'synced_count': 0
             }
     
-    async def sync_prices_from_sheet(self) -> Dict:
+    async def sync_prices_from_sheet(self, rows: Optional[List[Dict]] = None) -> Dict:
         """Синхронизация цен из Google Sheets"""
         try:
             print("🔄 Синхронизация цен из Google Sheets...")
             
-            # Получаем данные из Google Sheets
-            rows = self.sheet_client.read_rows()
+            # Получаем данные из Google Sheets (если строки не переданы)
+            if rows is None:
+                rows = self.sheet_client.read_rows()
             
             if not rows:
                 return {
@@ -111,42 +151,70 @@ class SheetSyncService:
                     'updated_count': 0
                 }
             
-            # Получаем цены для всех кейсов
-            prices_by_row = await self.price_fetcher.fetch_prices_in_batches(rows)
+            errors = []
+            pending_updates = {}
+            parsed_prices = []
+            fetched_prices = {}
+            unchanged_names = []
+            
+            await self._load_last_prices([str(row.get("Name", "")).strip() for row in rows])
+            
+            # Цены разбираются по мере прихода ответов Steam, не дожидаясь всей пачки
+            async for row_idx, price in self.price_fetcher.fetch_prices_in_batches(rows):
+                normalized_price = _normalize_price(price)
+                if normalized_price is None:
+                    continue
+                
+                case_name = str(rows[row_idx - 2].get("Name", "")).strip()
+                if not case_name:
+                    continue
+                
+                # Цена не изменилась с прошлой синхронизации — историю и таблицу не трогаем,
+                # но статистику пересчитываем: окна 24ч/7д/30д сдвигаются со временем
+                if price is not None and self._last_prices.get(case_name) == price:
+                    unchanged_names.append(case_name)
+                    continue
+                
+                parsed_prices.append((row_idx, case_name, normalized_price))
+                if price is not None:
+                    fetched_prices[case_name] = price
+                
+                # Цена для Google Sheets (запишем одним запросом после цикла)
+                pending_updates[row_idx] = price if price is not None else normalized_price
             
+            # Кейсы, цены и статистика сохраняются пакетно: три запроса вместо трех на строку
             updated_count = 0
-            errors = []
+            if unchanged_names:
+                print(f"⏭️ Цена не изменилась для {len(unchanged_names)} кейсов")
+            try:
+                case_ids = await self.db_service.bulk_save_cases(
+                    [name for _, name, _ in parsed_prices] + unchanged_names
+                )
+                await self.db_service.bulk_insert_prices([
+                    {'case_id': case_ids[name], 'price': normalized_price}
+                    for _, name, normalized_price in parsed_prices
+                ])
+                await self.db_service.bulk_update_case_statistics(list(case_ids.values()))
+                updated_count = len(parsed_prices)
+                print(f"✅ Обновлены цены для {updated_count} кейсов")
+            except Exception as e:
+                error_msg = f"Ошибка сохранения цен в базу данных: {e}"
+                errors.append(error_msg)
+                print(f"❌ {error_msg}")
+                pending_updates.clear()
             
-            for row_idx, price in prices_by_row.items():
+            if pending_updates:
                 try:
-                    normalized_price = _normalize_price(price)
-                    if normalized_price is None:
-                        continue
-                    
-                    # Получаем информацию о кейсе
-                    case_name = rows[row_idx - 2]["Name"]
-                    
-                    # Получаем или создаем кейс
-                    case = await self.db_service.save_case(case_name)
-                    
-                    # Сохраняем цену в историю
-                    await self.db_service.save_price(str(case.id), normalized_price)
-                    
-                    # Обновляем статистику
-                    await self.db_service.update_case_statistics(str(case.id))
-                    
-                    # Обновляем Google Sheets
-                    display_value = price if price is not None else normalized_price
-                    self.sheet_client.update_price(row_idx, display_value)
-                    
-                    updated_count += 1
-                    print(f"✅ Обновлена цена для {case_name}: {normalized_price} руб.")
-                    
+                    self.sheet_client.batch_update_prices(pending_updates)
+                    await self._remember_last_prices(fetched_prices)
                 except Exception as e:
-                    error_msg = f"Ошибка обновления цены для строки {row_idx}: {e}"
+                    error_msg = f"Ошибка обновления Google Sheets: {e}"
                     errors.append(error_msg)
                     print(f"❌ {error_msg}")
             
+            if updated_count or unchanged_names:
+                await self.db_service.refresh_analytics_views()
+            
             return {
                 'success': True,
                 'message': f'Обновлено {updated_count} цен',
@@ -165,11 +233,23 @@ class SheetSyncService:
         """Полная синхронизация данных с Google Sheets"""
         print("🚀 Запуск полной синхронизации с Google Sheets...")
         
+        # Таблица читается один раз для обоих этапов
+        try:
+            rows = self.sheet_client.read_rows()
+        except Exception as e:
+            error = {'success': False, 'message': f'Ошибка чтения Google Sheets: {e}'}
+            return {
+                'success': False,
+                'cases_sync': {**error, 'synced_count': 0},
+                'prices_sync': {**error, 'updated_count': 0},
+                'total_synced': 0
+            }
+        
         # Синхронизируем кейсы
-        cases_result = await self.sync_cases_from_sheet()
+        cases_result = await self.sync_cases_from_sheet(rows)
         
         # Синхронизируем цены
-        prices_result = await self.sync_prices_from_sheet()
+        prices_result = await self.sync_prices_from_sheet(rows)
         
         return {
             'success': cases_result['success'] and prices_result['success'],
@@ -178,6 +258,10 @@ class SheetSyncService:
             'total_synced': cases_result.get('synced_count', 0) + prices_result.get('updated_count', 0)
         }
     
+    async def close(self) -> None:
+        """Закрытие HTTP-сессии получения цен"""
+        await self.price_fetcher.close()
+    
     async def get_sheet_status(self) -> Dict:
         """Получение статуса Google Sheets"""
         try:
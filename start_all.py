@@ -3,6 +3,9 @@
 Скрипт для запуска всех сервисов CaseParser
 """
 
+import asyncio
+import os
+import signal
 import subprocess
 import sys
 import time
@@ -152,6 +155,52 @@ def start_frontend():
     return process
 
 
+async def wait_for_shutdown(processes):
+    """Ожидание Ctrl+C; завершившиеся процессы собираются по SIGCHLD, без периодического опроса"""
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    by_pid = {process.pid: (name, process) for name, process in processes}
+    
+    def reap():
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            
+            entry = by_pid.pop(pid, None)
+            if entry is not None:
+                name, process = entry
+                process.returncode = os.waitstatus_to_exitcode(status)
+                print(f"⚠️ {name} завершился неожиданно (код {process.returncode})")
+    
+    loop.add_signal_handler(signal.SIGCHLD, reap)
+    loop.add_signal_handler(signal.SIGINT, stop_event.set)
+    try:
+        # Процессы могли завершиться до установки обработчика
+        reap()
+        await stop_event.wait()
+    finally:
+        loop.remove_signal_handler(signal.SIGCHLD)
+        loop.remove_signal_handler(signal.SIGINT)
+
+
+def poll_until_interrupted(processes):
+    """Опрос процессов раз в секунду (для платформ без SIGCHLD)"""
+    reported = set()
+    try:
+        while True:
+            time.sleep(1)
+            for name, process in processes:
+                if name not in reported and process.poll() is not None:
+                    reported.add(name)
+                    print(f"⚠️ {name} завершился неожиданно")
+    except KeyboardInterrupt:
+        pass
+
+
 def main():
     """Основная функция"""
     print("🚀 Запуск всех сервисов CaseParser")
@@ -223,26 +272,34 @@ def main():
     
     print("\n🔍 Проверка доступности сервисов...")
     
-    # Проверяем API
     try:
         import requests
-        response = requests.get("http://localhost:8000/", timeout=5)
-        if response.status_code == 200:
-            print("✅ API сервер доступен")
-        else:
-            print(f"⚠️ API сервер вернул статус: {response.status_code}")
-    except Exception as e:
-        print(f"⚠️ API сервер недоступен: {e}")
+    except ImportError:
+        requests = None
+        print("⚠️ requests не установлен, пропускаем проверку доступности")
     
-    # Проверяем дашборд
-    try:
-        response = requests.get("http://localhost:8001/", timeout=5)
-        if response.status_code == 200:
-            print("✅ Дашборд доступен")
-        else:
-            print(f"⚠️ Дашборд вернул статус: {response.status_code}")
-    except Exception as e:
-        print(f"⚠️ Дашборд недоступен: {e}")
+    if requests is not None:
+        # Одна сессия на все проверки: соединения переиспользуются
+        with requests.Session() as http:
+            # Проверяем API
+            try:
+                response = http.get("http://localhost:8000/", timeout=5)
+                if response.status_code == 200:
+                    print("✅ API сервер доступен")
+                else:
+                    print(f"⚠️ API сервер вернул статус: {response.status_code}")
+            except Exception as e:
+                print(f"⚠️ API сервер недоступен: {e}")
+            
+            # Проверяем дашборд
+            try:
+                response = http.get("http://localhost:8001/", timeout=5)
+                if response.status_code == 200:
+                    print("✅ Дашборд доступен")
+                else:
+                    print(f"⚠️ Дашборд вернул статус: {response.status_code}")
+            except Exception as e:
+                print(f"⚠️ Дашборд недоступен: {e}")
     
     print("\n" + "=" * 50)
     print("🎉 CaseParser успешно запущен!")
@@ -252,26 +309,25 @@ def main():
     print("• Тестирование функций: python test_features.py")
     print("\n⚠️ Для остановки нажмите Ctrl+C")
     
-    try:
-        # Ждем завершения процессов
-        while True:
-            time.sleep(1)
-            # Проверяем, что процессы еще работают
-            for name, process in processes:
-                if process.poll() is not None:
-                    print(f"⚠️ {name} завершился неожиданно")
-    except KeyboardInterrupt:
-        print("\n🛑 Остановка сервисов...")
-        
-        # Останавливаем процессы
-        for name, process in processes:
-            try:
-                process.terminate()
-                print(f"✅ {name} остановлен")
-            except Exception as e:
-                print(f"❌ Ошибка остановки {name}: {e}")
-        
-        print("👋 До свидания!")
+    # Ждем Ctrl+C, отслеживая неожиданное завершение процессов
+    if hasattr(signal, "SIGCHLD"):
+        asyncio.run(wait_for_shutdown(processes))
+    else:
+        poll_until_interrupted(processes)
+    
+    print("\n🛑 Остановка сервисов...")
+    
+    # Останавливаем процессы
+    for name, process in processes:
+        if process.returncode is not None:
+            continue
+        try:
+            process.terminate()
+            print(f"✅ {name} остановлен")
+        except Exception as e:
+            print(f"❌ Ошибка остановки {name}: {e}")
+    
+    print("👋 До свидания!")
 
 
 if __name__ == "__main__":
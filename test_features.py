@@ -9,6 +9,7 @@ from datetime import datetime
 
 from src.core.cache import CacheManager, CacheService
 from src.core.database import DatabaseService
+from src.core.event_loop import install_uvloop
 from src.core.migrations import MigrationService
 from src.notifications.notifications import NotificationService
 from src.services.analytics import AnalyticsService
@@ -139,27 +140,29 @@ async def test_api_endpoints():
     try:
         import requests
         
-        # Тест основного API
-        print("   🔍 Проверка основного API...")
-        try:
-            response = requests.get("http://localhost:8000/", timeout=5)
-            if response.status_code == 200:
-                print("   ✅ Основной API доступен")
-            else:
-                print(f"   ⚠️ Основной API вернул статус: {response.status_code}")
-        except requests.exceptions.ConnectionError:
-            print("   ⚠️ Основной API недоступен (сервер не запущен)")
-        
-        # Тест дашборда
-        print("   📊 Проверка дашборда...")
-        try:
-            response = requests.get("http://localhost:8001/", timeout=5)
-            if response.status_code == 200:
-                print("   ✅ Дашборд доступен")
-            else:
-                print(f"   ⚠️ Дашборд вернул статус: {response.status_code}")
-        except requests.exceptions.ConnectionError:
-            print("   ⚠️ Дашборд недоступен (сервер не запущен)")
+        # Одна сессия на все проверки: соединения переиспользуются
+        with requests.Session() as http:
+            # Тест основного API
+            print("   🔍 Проверка основного API...")
+            try:
+                response = http.get("http://localhost:8000/", timeout=5)
+                if response.status_code == 200:
+                    print("   ✅ Основной API доступен")
+                else:
+                    print(f"   ⚠️ Основной API вернул статус: {response.status_code}")
+            except requests.exceptions.ConnectionError:
+                print("   ⚠️ Основной API недоступен (сервер не запущен)")
+            
+            # Тест дашборда
+            print("   📊 Проверка дашборда...")
+            try:
+                response = http.get("http://localhost:8001/", timeout=5)
+                if response.status_code == 200:
+                    print("   ✅ Дашборд доступен")
+                else:
+                    print(f"   ⚠️ Дашборд вернул статус: {response.status_code}")
+            except requests.exceptions.ConnectionError:
+                print("   ⚠️ Дашборд недоступен (сервер не запущен)")
             
     except ImportError:
         print("   ⚠️ requests не установлен, пропускаем тест API")
@@ -204,4 +207,5 @@ async def main():
 
 
 if __name__ == "__main__":
+    install_uvloop()
     asyncio.run(main())